@@ -0,0 +1,20 @@
+"""
+Shared pytest configuration.
+
+Puts the src directory on sys.path once per session, so the test modules can
+import the application modules by name whichever directory pytest runs from.
+
+Test databases are created in temporary directories, which are placed on the
+RAM-backed /dev/shm where it is available to avoid disk I/O.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+SRC_DIR = str(Path(__file__).resolve().parent)
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+    tempfile.tempdir = '/dev/shm'
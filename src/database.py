@@ -0,0 +1,138 @@
+"""
+SQLite Connection Module
+
+This module keeps a single long-lived connection per cache database.
+
+Opening a new connection for every cache lookup throws away SQLite's page
+cache each time, so instead each database path is connected to once and the
+connection is shared, guarded by a lock, for the lifetime of the process.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Set
+
+# Pragmas applied to every new connection
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+class _SharedConnection:
+    """A connection together with its lock and the schemas created on it"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False,
+                                    isolation_level=None, uri=True)
+        for pragma in CONNECTION_PRAGMAS:
+            self.conn.execute(pragma)
+        self.lock = threading.RLock()
+        self.schemas: Set[str] = set()
+
+
+_connections: Dict[str, _SharedConnection] = {}
+_connections_lock = threading.Lock()
+
+
+def _get_entry(path: str) -> _SharedConnection:
+    """
+    Returns the shared connection for a database path,
+    opening the connection on first use
+    """
+    path = str(path)
+    with _connections_lock:
+        entry = _connections.get(path)
+        if entry is None:
+            entry = _SharedConnection(path)
+            _connections[path] = entry
+        return entry
+
+
+def get_connection(path: str) -> sqlite3.Connection:
+    """
+    Returns the shared connection for a database path.
+
+    The connection is in autocommit mode; use `transaction` to group
+    several statements.
+    """
+    return _get_entry(path).conn
+
+
+@contextmanager
+def cursor(path: str) -> Iterator[sqlite3.Cursor]:
+    """
+    Yields a cursor on the shared connection while holding its lock
+
+    Args:
+        path: Path of the SQLite database file
+    """
+    entry = _get_entry(path)
+    with entry.lock:
+        cur = entry.conn.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
+@contextmanager
+def transaction(path: str) -> Iterator[sqlite3.Cursor]:
+    """
+    Yields a cursor inside a single transaction on the shared connection.
+
+    The transaction is committed when the block exits normally and rolled
+    back if it raises.
+
+    Args:
+        path: Path of the SQLite database file
+    """
+    with cursor(path) as cur:
+        cur.execute('BEGIN')
+        try:
+            yield cur
+        except BaseException:
+            cur.execute('ROLLBACK')
+            raise
+        cur.execute('COMMIT')
+
+
+def init_schema(path: str, schema: str) -> None:
+    """
+    Runs a schema script on the shared connection, once per connection.
+
+    Later calls with the same script are a no-op, so callers can ensure
+    their tables exist before every query without repeating the DDL.
+
+    Args:
+        path: Path of the SQLite database file
+        schema: SQL script of CREATE ... IF NOT EXISTS statements
+    """
+    entry = _get_entry(path)
+    with entry.lock:
+        if schema not in entry.schemas:
+            entry.conn.executescript(schema)
+            entry.schemas.add(schema)
+
+
+def close_connection(path: str) -> None:
+    """
+    Closes the shared connection for a database path, if one is open
+    """
+    with _connections_lock:
+        entry = _connections.pop(str(path), None)
+    if entry is not None:
+        with entry.lock:
+            entry.conn.close()
+
+
+def close_all_connections() -> None:
+    """
+    Closes every shared connection
+    """
+    with _connections_lock:
+        paths = list(_connections)
+    for path in paths:
+        close_connection(path)
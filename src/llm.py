@@ -0,0 +1,247 @@
+"""
+LLM Client Module
+
+This module provides the shared client for calling LLMs hosted on Nebius AI Studio.
+
+Responses are cached in an SQLite database keyed by a hash of the model and
+prompt, so repeating an identical request returns the stored response instead
+of making another API call.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import os
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from dotenv import load_dotenv
+
+import database
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Connection pool limits for the HTTP clients talking to the LLM API
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+
+# Use HTTP/2 so concurrent requests are multiplexed over pooled connections
+client = OpenAI(
+    base_url="https://api.studio.nebius.com/v1/",
+    api_key=os.environ.get("NEBIUS_API_KEY"),
+    http_client=DefaultHttpxClient(http2=True, limits=HTTP_LIMITS)
+)
+
+async_client = AsyncOpenAI(
+    base_url="https://api.studio.nebius.com/v1/",
+    api_key=os.environ.get("NEBIUS_API_KEY"),
+    http_client=DefaultAsyncHttpxClient(http2=True, limits=HTTP_LIMITS)
+)
+
+T = TypeVar('T')
+
+# Event loop that async_client is used on. Pooled connections belong to the
+# loop that opened them, so every request has to run on the same long-lived
+# loop rather than a new one from asyncio.run.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the shared event loop, starting it in a daemon thread on first use
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='llm-event-loop', daemon=True).start()
+        return _loop
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Runs a coroutine that calls async_client on the shared event loop
+    and waits for its result
+
+    Args:
+        coro: The coroutine to run
+
+    Returns:
+        The result of the coroutine
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+# Cache database path
+LLM_CACHE_DB = './data/llm_cache.db'
+
+LLM_CACHE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT,
+        created_at TIMESTAMP
+    );
+'''
+
+
+def init_llm_cache() -> None:
+    """
+    Initializes the SQLite database for caching LLM responses, once per connection
+    """
+    database.init_schema(LLM_CACHE_DB, LLM_CACHE_SCHEMA)
+
+
+def get_cache_key(model: str, prompt: str) -> str:
+    """
+    Returns the cache key for a request to the given model with the given prompt
+    """
+    return hashlib.sha256(f"{model}|{prompt}".encode('utf-8')).hexdigest()
+
+
+def get_cached_response(key: str) -> Optional[str]:
+    """
+    Retrieves a cached LLM response.
+
+    Args:
+        key: Cache key of the request
+
+    Returns:
+        The response content if found, None otherwise
+    """
+    with database.cursor(LLM_CACHE_DB) as cursor:
+        cursor.execute('SELECT response FROM llm_cache WHERE key = ?', (key,))
+        result = cursor.fetchone()
+
+    if result:
+        return result[0]
+    return None
+
+
+def save_response_to_cache(key: str, response: str) -> None:
+    """
+    Saves a raw LLM response to cache
+
+    Args:
+        key: Cache key of the request
+        response: Response content to cache
+    """
+    with database.cursor(LLM_CACHE_DB) as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO llm_cache
+            (key, response, created_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (
+            key,
+            response
+        ))
+
+
+def _lookup(key: str) -> Optional[str]:
+    try:
+        init_llm_cache()
+        return get_cached_response(key)
+    except Exception as e:
+        print(f"Error reading LLM cache: {e}")
+        return None
+
+
+def _store(key: str, response: Optional[str]) -> None:
+    # Failed calls return None and are not cached, so they are retried
+    if not response:
+        return
+    try:
+        save_response_to_cache(key, response)
+    except Exception as e:
+        print(f"Error writing LLM cache: {e}")
+
+
+def disk_cache(func):
+    """
+    Caches the responses of an LLM call function taking (model, prompt)
+
+    Works for both regular and async functions. Errors while reading or
+    writing the cache are reported and the API is called as if uncached.
+    """
+    defaults = inspect.signature(func).parameters
+    default_model = defaults['model'].default
+    default_prompt = defaults['prompt'].default
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(model=default_model, prompt=default_prompt):
+            key = get_cache_key(model, prompt)
+            cached = _lookup(key)
+            if cached:
+                return cached
+
+            response = await func(model, prompt)
+            _store(key, response)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(model=default_model, prompt=default_prompt):
+        key = get_cache_key(model, prompt)
+        cached = _lookup(key)
+        if cached:
+            return cached
+
+        response = func(model, prompt)
+        _store(key, response)
+        return response
+
+    return wrapper
+
+
+def _chat_request(model: str, prompt: str) -> dict:
+    """
+    Returns the chat completion parameters for a single-message request
+    """
+    return dict(
+        model=model,
+        max_tokens=8192,
+        temperature=0.2,
+        top_p=0.9,
+        extra_body={
+            "top_k": 50
+        },
+        messages=[
+            {"role": "user",
+             "content": prompt
+            }
+        ]
+    )
+
+
+@disk_cache
+def call_nebius_llm(model="deepseek-ai/DeepSeek-R1", prompt=""):
+    """
+    Sends a single-message chat completion request
+
+    Returns:
+        The content of the response message, or None if the request failed
+    """
+    try:
+        response = client.chat.completions.create(**_chat_request(model, prompt))
+        return response.choices[0].message.content
+
+    except Exception as e:
+        print(f"Error making API call: {e}")
+        return None
+
+
+@disk_cache
+async def call_nebius_llm_async(model="deepseek-ai/DeepSeek-R1", prompt=""):
+    """
+    Asynchronous variant of call_nebius_llm
+    """
+    try:
+        response = await async_client.chat.completions.create(**_chat_request(model, prompt))
+        return response.choices[0].message.content
+
+    except Exception as e:
+        print(f"Error making API call: {e}")
+        return None
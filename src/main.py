@@ -1,8 +1,8 @@
 from flask import Flask, request, jsonify, render_template
 
-from transcriber import transcribe_youtube_video
-from modules import structure_transcript
-from quizzes import get_quiz
+# The transcriber, modules and quizzes modules pull in Whisper, yt-dlp and the
+# LLM client, so they are imported inside the routes that need them to keep
+# application start-up fast.
 
 app = Flask(__name__)
 
@@ -18,11 +18,19 @@ def index():
 
 @app.route('/modules', methods=['GET'])
 def modules():
+    from transcriber import transcribe_youtube_video
+    from modules import get_cached_modules, structure_transcript
+
     try:
         video_id = request.args.get('video_id', '')
         if not video_id:
             return jsonify(error="Video ID is required"), 400
 
+        # Serve cached modules without fetching or transcribing the video
+        cached_modules = get_cached_modules(video_id)
+        if cached_modules:
+            return jsonify(modules=cached_modules)
+
         video_transcript = transcribe_youtube_video(f'https://www.youtube.com/watch?v={video_id}')
         modules = structure_transcript(video_transcript)
         return jsonify(modules=modules)
@@ -33,6 +41,8 @@ def modules():
 
 @app.route('/generate_quiz', methods=['GET'])
 def generate_quiz():
+    from quizzes import get_quiz
+
     try:
         video_id = request.args.get('video_id', '')
         module_title = request.args.get('module_title', '')
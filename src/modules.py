@@ -1,120 +1,113 @@
-import os
 import re
-import sqlite3
-import json
-from datetime import datetime
-from openai import OpenAI
-from dotenv import load_dotenv
 
 from typing import Optional, List, Dict
 
+import numpy as np
+import orjson
+
+import database
+from llm import call_nebius_llm
+
 # Database path
 MODULES_CACHE_DB = './data/modules.db'
 
+# Length of a module in seconds
+CHUNK_SIZE = 600  # 10 minutes
 
-# Load environment variables from .env file
-load_dotenv()
+# Matches the video ID in YouTube watch, embed and short URLs
+_VIDEO_ID_RE = re.compile(r'(?:v=|embed/|shorts/|youtu\.be/)([a-zA-Z0-9_-]{11})')
 
-client = OpenAI(
-    base_url="https://api.studio.nebius.com/v1/",
-    api_key=os.environ.get("NEBIUS_API_KEY")
-)
+# Matches the JSON array of titles in a batched title response
+_JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
 
-def call_nebius_llm(model="deepseek-ai/DeepSeek-R1", prompt=""):
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            max_tokens=8192,
-            temperature=0.2,
-            top_p=0.9,
-            extra_body={
-                "top_k": 50
-            },
-            messages=[
-                {"role": "user",
-                 "content": prompt
-                }
-            ]
-        )
-        result = response.to_json()
-        return result
+COURSE_MODULES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS course_modules (
+        video_id TEXT PRIMARY KEY,
+        modules BLOB,
+        created_at TIMESTAMP
+    );
+'''
 
-    except Exception as e:
-        print(f"Error making API call: {e}")
-        return None
 
-
-def init_course_cache() -> None:
+def init_course_cache(db_path: Optional[str] = None) -> None:
     """
-    Initializes the SQLite database for caching course structures
+    Initializes the SQLite database for caching course structures.
+
+    The table is only created once per database connection, so this is
+    cheap to call before every cache access.
+
+    Args:
+        db_path: Path of the cache database, MODULES_CACHE_DB by default
     """
-    conn = sqlite3.connect(MODULES_CACHE_DB)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS course_modules (
-            video_id TEXT PRIMARY KEY,
-            modules TEXT,
-            created_at TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    database.init_schema(db_path or MODULES_CACHE_DB, COURSE_MODULES_SCHEMA)
 
 
-def get_cached_modules(video_id: str) -> Optional[List[Dict]]:
+def get_cached_modules(video_id: str, db_path: Optional[str] = None) -> Optional[List[Dict]]:
     """
     Retrieves cached course modules for a given transcript ID.
 
     Args:
         video_id: Unique identifier for the transcript
+        db_path: Path of the cache database, MODULES_CACHE_DB by default
 
     Returns:
         List of module dictionaries if found, None otherwise
     """
-    conn = sqlite3.connect(MODULES_CACHE_DB)
-    cursor = conn.cursor()
-    cursor.execute('SELECT modules FROM course_modules WHERE video_id = ?',
-                   (video_id,))
-    result = cursor.fetchone()
-    conn.close()
+    db_path = db_path or MODULES_CACHE_DB
+    init_course_cache(db_path)
+    with database.cursor(db_path) as cursor:
+        cursor.execute('SELECT modules FROM course_modules WHERE video_id = ?',
+                       (video_id,))
+        result = cursor.fetchone()
 
     if result:
-        return json.loads(result[0])
+        return orjson.loads(result[0])
     return None
 
 
-def save_modules_to_cache(video_id: str, modules: List[Dict]) -> None:
+def save_modules_to_cache(video_id: str, modules: List[Dict],
+                          db_path: Optional[str] = None) -> None:
     """
     Saves structured course modules to cache
 
     Args:
         video_id: Unique identifier for the transcript
         modules: List of module dictionaries to cache
+        db_path: Path of the cache database, MODULES_CACHE_DB by default
     """
-    conn = sqlite3.connect(MODULES_CACHE_DB)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO course_modules 
-        (video_id, modules, created_at)
-        VALUES (?, ?, ?)
-    ''', (
-        video_id,
-        json.dumps(modules),
-        datetime.now()
-    ))
-    conn.commit()
-    conn.close()
+    db_path = db_path or MODULES_CACHE_DB
+    init_course_cache(db_path)
+    with database.cursor(db_path) as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO course_modules 
+            (video_id, modules, created_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (
+            video_id,
+            orjson.dumps(modules)
+        ))
 
 
 def extract_video_id(url):
     # Match the video ID pattern in YouTube embed URLs
-    pattern = r'(?:embed\/|watch\?v=|\/)?([a-zA-Z0-9_-]{11})'
-    match = re.search(pattern, url)
+    match = _VIDEO_ID_RE.search(url)
     if match:
         return match.group(1)
     return None
 
 
+def _make_module(transcript: List[Dict], start_idx: int, end_idx: int) -> Dict:
+    """
+    Builds an untitled module from the transcript entries in [start_idx, end_idx)
+    """
+    return {
+        'title': '',
+        'content': transcript[start_idx:end_idx],
+        'start_time': transcript[start_idx]['start'],
+        'end_time': transcript[end_idx - 1]['end']
+    }
+
+
 def structure_transcript(video: Dict) -> List[Dict]:
     """
     Structures transcript into logical parts with caching
@@ -123,51 +116,36 @@ def structure_transcript(video: Dict) -> List[Dict]:
     video_id = extract_video_id(video['embed_url'])
     print(f"Generating course structure for video ID: {video_id}")
 
-    # Initialize cache database
-    init_course_cache()
-
     # Check cache first
     cached_modules = get_cached_modules(video_id)
     if cached_modules:
         print("Retrieved course structure from cache")
         return cached_modules
 
-    # If not in cache, generate a new structure
+    # If not in cache, generate a new structure by splitting the transcript
+    # into chunks of CHUNK_SIZE seconds. Chunk boundaries are found with a
+    # binary search over the (sorted) start times instead of a Python scan.
+    transcript = video['transcript']
     modules = []
-    current_module = {
-        'title': '',
-        'content': [],
-        'start_time': 0,
-        'end_time': 0
-    }
 
-    CHUNK_SIZE = 600  # 10 minutes in seconds
-
-    for entry in video['transcript']:
-        if not current_module['content']:
-            current_module['start_time'] = entry['start']
-            current_module['content'].append(entry)
-        elif entry['start'] - current_module['start_time'] < CHUNK_SIZE:
-            current_module['content'].append(entry)
-        else:
-            # Finalize current module
-            current_module['end_time'] = current_module['content'][-1]['end']
-            current_module['title'] = generate_module_title(current_module['content'])
-            modules.append(current_module.copy())
-
-            # Start new module
-            current_module = {
-                'title': '',
-                'content': [entry],
-                'start_time': entry['start'],
-                'end_time': 0
-            }
-
-    # Add the last module if it has content
-    if current_module['content']:
-        current_module['end_time'] = current_module['content'][-1]['end']
-        current_module['title'] = generate_module_title(current_module['content'])
-        modules.append(current_module)
+    if transcript:
+        starts = np.fromiter((entry['start'] for entry in transcript),
+                             dtype=np.float64, count=len(transcript))
+        start_idx = 0
+        while start_idx < len(transcript):
+            # First entry at least CHUNK_SIZE seconds after the module start
+            end_idx = int(np.searchsorted(starts, starts[start_idx] + CHUNK_SIZE, side='left'))
+            # The search assumes sorted start times; with out-of-order or NaN
+            # starts it can land at or before the module start, so always
+            # take at least one entry to keep advancing
+            end_idx = max(end_idx, start_idx + 1)
+            modules.append(_make_module(transcript, start_idx, end_idx))
+            start_idx = end_idx
+
+    # Title all modules with a single LLM request
+    titles = generate_module_titles_batch([module['content'] for module in modules])
+    for module, title in zip(modules, titles):
+        module['title'] = title
 
     # Save to cache
     save_modules_to_cache(video_id, modules)
@@ -192,11 +170,9 @@ class TitleGenerator:
 
         try:
             title = None
-            response = call_nebius_llm(model=self.model, prompt=prompt)
-            if response:
-                response_dict = json.loads(response)
-                # Extract content from the response
-                title = response_dict['choices'][0]['message']['content'].strip()
+            content = call_nebius_llm(model=self.model, prompt=prompt)
+            if content:
+                title = content.strip()
 
             return title
 
@@ -204,6 +180,84 @@ class TitleGenerator:
             print(f"Error generating title: {e}")
             return None
 
+    def generate_titles(self, texts: List[str]) -> Optional[List[str]]:
+        """
+        Generates titles for several contents with a single LLM request
+
+        Returns:
+            One title per content in the same order, or None if the response
+            could not be parsed into exactly that many titles
+        """
+        chunks = '\n\n'.join(f"Chunk {i}:\n{text}" for i, text in enumerate(texts, 1))
+        prompt = f"""Generate a concise and descriptive title for each of the following numbered chunks.
+                Each title should be between 3 to 10 words and capture the main topic of its chunk.
+                Respond only with a JSON array of exactly {len(texts)} strings, one title per chunk, in order.
+
+                {chunks}
+
+                Titles:
+                """
+
+        try:
+            content = call_nebius_llm(model=self.model, prompt=prompt)
+            if not content:
+                return None
+
+            # Extract the JSON array from the response
+            array_match = _JSON_ARRAY_RE.search(content)
+            if not array_match:
+                return None
+            titles = orjson.loads(array_match.group(0))
+
+            if (not isinstance(titles, list) or len(titles) != len(texts)
+                    or not all(isinstance(title, str) and title.strip() for title in titles)):
+                return None
+            return [title.strip() for title in titles]
+
+        except Exception as e:
+            print(f"Error generating titles: {e}")
+            return None
+
+
+_title_generator: Optional[TitleGenerator] = None
+
+
+def get_title_generator() -> TitleGenerator:
+    """
+    Returns the shared TitleGenerator, creating it on first use
+    """
+    global _title_generator
+    if _title_generator is None:
+        _title_generator = TitleGenerator()
+    return _title_generator
+
+
+def generate_module_titles_batch(contents: List[List[Dict]]) -> List[str]:
+    """
+    Generates titles for all modules with a single LLM request
+
+    Falls back to generating each title separately if the batched
+    response cannot be parsed.
+    """
+    if not contents:
+        return []
+
+    texts = [' '.join([entry['text'] for entry in content]) for content in contents]
+
+    try:
+        generator = get_title_generator()
+        titles = generator.generate_titles(texts)
+
+        if isinstance(titles, list) and len(titles) == len(contents):
+            # Convert to a title case and remove the final punctuation
+            return [title.title().rstrip('.!?') for title in titles]
+
+    except Exception as e:
+        print(f"Error generating titles: {e}")
+
+    print("Falling back to generating module titles one by one")
+    return [_generate_title_from_text(text) for text in texts]
+
 
 def generate_module_title(content: List[Dict]) -> str:
     """
@@ -211,10 +265,16 @@ def generate_module_title(content: List[Dict]) -> str:
     """
     # Combine all text in the module
     full_text = ' '.join([entry['text'] for entry in content])
+    return _generate_title_from_text(full_text)
 
+
+def _generate_title_from_text(full_text: str) -> str:
+    """
+    Generates a title using the LLM based on the combined text of a module
+    """
     try:
-        # Initialize the generator if not already done
-        generator = TitleGenerator()
+        # Reuse the shared generator
+        generator = get_title_generator()
 
         title = generator.generate_title(full_text)
 
@@ -226,8 +286,9 @@ def generate_module_title(content: List[Dict]) -> str:
     except Exception as e:
         print(f"Error generating title: {e}")
 
-    # Fallback to simple approach if model fails
-    words = full_text.split()
+    # Fallback to simple approach if model fails; only the first
+    # 10 words are needed, so stop splitting after them
+    words = full_text.split(maxsplit=10)
     if len(words) > 10:
         return ' '.join(words[:10]) + '...'
     return full_text
@@ -9,51 +9,29 @@ the correct answer, and an explanation.
 """
 from __future__ import annotations
 
-import json
+import asyncio
+import atexit
 import logging
+import logging.handlers
 import os
-import sqlite3
+import queue
 import re
 
-from datetime import datetime
 from pathlib import Path
 from typing import Optional, List, Dict, Any
-from openai import OpenAI
-from dotenv import load_dotenv
 
+import orjson
+
+import database
+from llm import call_nebius_llm, call_nebius_llm_async, run_async
 from modules import get_cached_modules
 
-# Load environment variables from .env file
-load_dotenv()
-
-client = OpenAI(
-    base_url="https://api.studio.nebius.com/v1/",
-    api_key=os.environ.get("NEBIUS_API_KEY")
-)
-
-
-def call_nebius_llm(model="deepseek-ai/DeepSeek-R1", prompt=""):
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            max_tokens=8192,
-            temperature=0.2,
-            top_p=0.9,
-            extra_body={
-                "top_k": 50
-            },
-            messages=[
-                {"role": "user",
-                 "content": prompt
-                }
-            ]
-        )
-        result = response.to_json()
-        return result
-
-    except Exception as e:
-        print(f"Error making API call: {e}")
-        return None
+# Maximum number of quiz generation requests in flight at once
+MAX_CONCURRENT_REQUESTS = 10
+
+# Matches the JSON code block in a quiz generation response
+_JSON_BLOCK_RE = re.compile(r'```json\n(.*?)\n```', re.DOTALL)
+
 
 # Define an absolute path for logs directory at project root level
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -77,6 +55,13 @@ def setup_logging():
     file_handler = logging.FileHandler(log_file)
     file_handler.setLevel(logging.DEBUG)
 
+    # Write the log file from a background thread, so requests don't wait on disk I/O
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
     # Create a console handler with a higher log level
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
@@ -92,7 +77,7 @@ def setup_logging():
     console_handler.setFormatter(console_formatter)
 
     # Add the handlers to the logger
-    logger.addHandler(file_handler)
+    logger.addHandler(queue_handler)
     logger.addHandler(console_handler)
 
     return logger
@@ -133,66 +118,84 @@ def get_module_text(module: dict) -> str:
 # Cache database path
 QUIZ_CACHE_DB = './data/quizes.db'
 
+MODULE_QUESTIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS module_questions (
+        video_id TEXT,
+        module_title TEXT,
+        difficulty TEXT,
+        questions BLOB,
+        created_at TIMESTAMP,
+        PRIMARY KEY (video_id, module_title)
+    );
+'''
+
 class QuizCache:
-    def __init__(self, cache_path: str = QUIZ_CACHE_DB):
-        self.cache_path = Path(cache_path)
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = Path(cache_path or QUIZ_CACHE_DB)
         self.init_table()
 
 
     def init_table(self):
-        """Initialize the SQLite database for caching quiz questions"""
-        conn = sqlite3.connect(self.cache_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS module_questions (
-                video_id TEXT,
-                module_title TEXT,
-                difficulty TEXT,
-                questions TEXT,
-                created_at TIMESTAMP,
-                PRIMARY KEY (video_id, module_title)
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        """Initialize the SQLite database for caching quiz questions, once per connection"""
+        database.init_schema(self.cache_path, MODULE_QUESTIONS_SCHEMA)
 
     def get_cached_quiz(self, video_id: str, module_title: str) -> Optional[List[Dict]]:
         """Retrieve cached quiz questions for a given topic and difficulty"""
-        conn = sqlite3.connect(QUIZ_CACHE_DB)
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT questions FROM module_questions WHERE video_id = ? AND module_title = ?',
-            (video_id, module_title)
-        )
-        result = cursor.fetchone()
-        conn.close()
+        with database.cursor(self.cache_path) as cursor:
+            cursor.execute(
+                'SELECT questions FROM module_questions WHERE video_id = ? AND module_title = ?',
+                (video_id, module_title)
+            )
+            result = cursor.fetchone()
 
         if result:
-            return json.loads(result[0])
+            return orjson.loads(result[0])
         return None
 
+    def get_cached_quizzes(self, video_id: str) -> Dict[str, List[Dict]]:
+        """Retrieve the cached quiz questions of every module of a video, keyed by module title"""
+        with database.cursor(self.cache_path) as cursor:
+            cursor.execute(
+                'SELECT module_title, questions FROM module_questions WHERE video_id = ?',
+                (video_id,)
+            )
+            rows = cursor.fetchall()
+
+        return {module_title: orjson.loads(questions) for module_title, questions in rows}
+
     def save_quiz_to_cache(self, video_id: str, module_title: str,
                            difficulty: str, questions: List[Dict]):
         """Save generated quiz questions to cache"""
-        conn = sqlite3.connect(QUIZ_CACHE_DB)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO module_questions 
-            (video_id, module_title, difficulty, questions, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            video_id,
-            module_title,
-            difficulty,
-            json.dumps(questions),
-            datetime.now()
-        ))
-        conn.commit()
-        conn.close()
-
-
-def gen_prompt(text, difficulty="medium", num_questions=2):
-    return f"""Create {num_questions} {difficulty} multiple-choice questions in JSON format 
+        with database.cursor(self.cache_path) as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO module_questions 
+                (video_id, module_title, difficulty, questions, created_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (
+                video_id,
+                module_title,
+                difficulty,
+                orjson.dumps(questions)
+            ))
+
+    def save_quizzes_to_cache(self, video_id: str, difficulty: str,
+                              module_quizzes: List[Dict]):
+        """Save the generated quizzes of several modules to cache in a single transaction"""
+        rows = [
+            (video_id, quiz['module_title'], difficulty, orjson.dumps(quiz['questions']))
+            for quiz in module_quizzes
+        ]
+        with database.transaction(self.cache_path) as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO module_questions 
+                (video_id, module_title, difficulty, questions, created_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', rows)
+
+
+# Static part of the quiz prompt between the question count and the source text.
+# It is a plain string, so the braces of the JSON example need no escaping.
+_QUIZ_PROMPT_BODY = """ multiple-choice questions in JSON format 
         from the text below.
 
         Format question as JSON array with:
@@ -204,19 +207,30 @@ def gen_prompt(text, difficulty="medium", num_questions=2):
         Example Response:
         ```json
         [
-          {{
+          {
             "question": "What is Python's main feature?",
-            "options": {{"A": "Static typing", "B": "Dynamic typing", "C": "Compiled", "D": "Low-level"}},
+            "options": {"A": "Static typing", "B": "Dynamic typing", "C": "Compiled", "D": "Low-level"},
             "correct_answer": "B",
             "explanation": "Python uses dynamic typing by default"
-          }}
+          }
         ]```
 
-        Text: {text}
-        """
+        Text: """
+
+
+def gen_prompt(text: str, difficulty: str = "medium", num_questions: int = 2) -> str:
+    """
+    Builds the quiz prompt for a module text with a single f-string
+
+    The prompt is part of the LLM cache key, so its wording must not change
+    without invalidating the cached quizzes.
+    """
+    return f"Create {num_questions} {difficulty}{_QUIZ_PROMPT_BODY}{text}\n        "
 
 
 class CourseDesignerAgent:
+    model = "deepseek-ai/DeepSeek-V3"
+
     def generate_quiz_questions(self, text: str, difficulty: str, num_questions: int = 2) -> List[Dict]:
         """
         Generate a quiz question based on the given transcribed text and difficulty level
@@ -230,41 +244,74 @@ class CourseDesignerAgent:
         """
         if not text or num_questions < 1:
             return []
-        prompt = gen_prompt(text, difficulty=difficulty, num_questions=num_questions)
-
-        logger.info("Generating quiz questions")
-        logger.debug(f"Using prompt: {prompt[:100]}...")  # Log the first 100 chars of prompt
+        prompt = self._build_prompt(text, difficulty, num_questions)
 
         try:
             # Generate question
             logger.debug("Sending request to LLM API")
-            model = "deepseek-ai/DeepSeek-V3"
-            response = call_nebius_llm(model, prompt)
-            if response:
-                response_dict = json.loads(response)
-                # Extract content from the response
-                content = response_dict['choices'][0]['message']['content']
+            content = call_nebius_llm(self.model, prompt)
+            return self._parse_questions(content, text)
 
-            logger.debug("Received response from LLM API")
-            logger.debug(f"Generated content: {content}")
+        except Exception as e:
+            logger.debug("Error generating question: %s", e)
+            return []
 
-            # Extract JSON from a Markdown code block
-            json_block = re.search(r'```json\n(.*?)\n```', content, re.DOTALL)
+    async def generate_quiz_questions_async(self, text: str, difficulty: str,
+                                            num_questions: int = 2) -> List[Dict]:
+        """
+        Asynchronous variant of generate_quiz_questions, so that several modules
+        can wait on the LLM API at the same time
+
+        Args:
+            text: The transcribed text source for question generation
+            difficulty: Difficulty level (easy, medium, hard)
 
-            # Extract the actual JSON string from the match object
-            if json_block:
-                questions = json.loads(json_block.group(1))
-            else:
-                logger.debug("No JSON block found in the response")
-                questions = [self._create_fallback_question(text)]
+        Returns:
+            List of dictionaries containing questions and answers
+        """
+        if not text or num_questions < 1:
+            return []
+        prompt = self._build_prompt(text, difficulty, num_questions)
 
-            logger.info(f"Successfully generated {len(questions)} questions")
-            return questions
+        try:
+            # Generate question
+            logger.debug("Sending request to LLM API")
+            content = await call_nebius_llm_async(self.model, prompt)
+            return self._parse_questions(content, text)
 
         except Exception as e:
-            logger.debug(f"Error generating question: {e}")
+            logger.debug("Error generating question: %s", e)
             return []
 
+    def _build_prompt(self, text: str, difficulty: str, num_questions: int) -> str:
+        prompt = gen_prompt(text, difficulty=difficulty, num_questions=num_questions)
+
+        logger.info("Generating quiz questions")
+        logger.debug("Using prompt: %.100s...", prompt)  # Log the first 100 chars of prompt
+        return prompt
+
+    def _parse_questions(self, content: Optional[str], text: str) -> List[Dict]:
+        """Extract the list of questions from the LLM response content"""
+        if not content:
+            logger.debug("No response received from LLM API")
+            return []
+
+        logger.debug("Received response from LLM API")
+        logger.debug("Generated content: %s", content)
+
+        # Extract JSON from a Markdown code block
+        json_block = _JSON_BLOCK_RE.search(content)
+
+        # Extract the actual JSON string from the match object
+        if json_block:
+            questions = orjson.loads(json_block.group(1))
+        else:
+            logger.debug("No JSON block found in the response")
+            questions = [self._create_fallback_question(text)]
+
+        logger.info("Successfully generated %d questions", len(questions))
+        return questions
+
     def _create_fallback_question(self, text: str) -> Dict:
         return {
             "question": "What is the main focus of " + text[:15] + "?",
@@ -290,7 +337,6 @@ def get_quiz(video_id: str, module_title: str,
 
     # Initialize cache
     quiz_cache = QuizCache()
-    quiz_cache.init_table()
 
     # Check cache first
     cached_questions = quiz_cache.get_cached_quiz(video_id, module_title)
@@ -318,43 +364,96 @@ def generate_all_module_quizzes(video_id: str,
     Returns:
         list: List of dictionaries containing module information and their respective quizzes
     """
-    # Initialize quiz cache if needed
+    # Initialize quiz cache
     quiz_cache = QuizCache()
-    quiz_cache.init_table()
 
     # Get all modules
     modules = get_cached_modules(video_id)
     if not modules:
         raise ValueError("No modules found in cache")
 
-    # Initialize CourseDesignerAgent
-    agent = CourseDesignerAgent()
-
-    # Generate quizzes for each module
-    module_quizzes = []
-    for i, module in enumerate(modules):
-        module_text = get_module_text(module)
-        if not module_text:
+    # Reuse the quizzes of modules that were already generated. An empty
+    # quiz is left over from a failed generation, so it is generated again.
+    cached_quizzes = {
+        module_title: questions
+        for module_title, questions in quiz_cache.get_cached_quizzes(video_id).items()
+        if questions
+    }
+
+    # Collect the modules without a cached quiz that have text to generate questions from
+    pending = []
+    for module in modules:
+        module_title = module.get('title', '')
+        if module_title in cached_quizzes:
             continue
+        module_text = get_module_text(module)
+        if module_text:
+            pending.append((module_title, module_text))
+
+    generated_quizzes = []
+    if pending:
+        # Initialize CourseDesignerAgent
+        agent = CourseDesignerAgent()
+
+        # Generate quizzes for the missing modules concurrently
+        results = run_async(_gather_quiz_questions(
+            agent,
+            [module_text for _, module_text in pending],
+            difficulty
+        ))
 
-        try:
-            questions = agent.generate_quiz_questions(
-                module_text,
-                difficulty
-            )
-
-            module_quiz = {
-                'module_title': module.get('title', ''),
+        for (module_title, _), questions in zip(pending, results):
+            if isinstance(questions, Exception):
+                logger.debug("Error generating quiz for module %s: %s", module_title, questions)
+                continue
+            # A failed LLM call yields no questions; leave the module uncached
+            # so that the next request retries it
+            if not questions:
+                logger.debug("No questions generated for module %s", module_title)
+                continue
+
+            generated_quizzes.append({
+                'module_title': module_title,
                 'questions': questions
-            }
-            module_quizzes.append(module_quiz)
+            })
+            logger.debug("Generated quiz for module %s with %d questions", module_title, len(questions))
 
-            # Save the generated quiz to cache
-            quiz_cache.save_quiz_to_cache(video_id, module_quiz['module_title'], difficulty, questions)
-            logger.debug(f"Generated quiz for module {module.get('title', '')} with {len(questions)} questions")
+        # Save all generated quizzes to cache in a single transaction
+        if generated_quizzes:
+            try:
+                quiz_cache.save_quizzes_to_cache(video_id, difficulty, generated_quizzes)
+            except Exception as e:
+                logger.debug("Error saving quizzes for video %s: %s", video_id, e)
 
-        except Exception as e:
-            logger.debug(f"Error generating quiz for module {module.get('title', '')}: {str(e)}")
-            continue
+    # Return the quizzes in module order, whether cached or newly generated
+    quizzes_by_title = dict(cached_quizzes)
+    quizzes_by_title.update((quiz['module_title'], quiz['questions']) for quiz in generated_quizzes)
+
+    module_quizzes = []
+    for module in modules:
+        module_title = module.get('title', '')
+        if module_title in quizzes_by_title:
+            module_quizzes.append({
+                'module_title': module_title,
+                'questions': quizzes_by_title.pop(module_title)
+            })
 
     return module_quizzes
+
+
+async def _gather_quiz_questions(agent: CourseDesignerAgent, texts: List[str],
+                                 difficulty: str) -> list:
+    """
+    Run quiz generation for several module texts concurrently
+
+    At most MAX_CONCURRENT_REQUESTS requests are sent to the LLM API at once.
+    Results are returned in the order of `texts`; a failed generation is
+    returned as its exception instead of aborting the other modules.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def generate(text: str) -> List[Dict]:
+        async with semaphore:
+            return await agent.generate_quiz_questions_async(text, difficulty)
+
+    return await asyncio.gather(*(generate(text) for text in texts), return_exceptions=True)
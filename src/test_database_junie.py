@@ -0,0 +1,109 @@
+import unittest
+import sqlite3
+import os
+import tempfile
+import threading
+
+import database
+
+
+class TestSharedConnections(unittest.TestCase):
+    """Tests for the shared connections in the Database module."""
+
+    def setUp(self):
+        """Set up test environment before each test."""
+        # Keep the test database in a fresh temporary directory
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_db_path = os.path.join(self.temp_dir.name, 'database_test.db')
+
+    def tearDown(self):
+        """Clean up after each test."""
+        # Close the shared connection and remove the temporary directory
+        database.close_connection(self.test_db_path)
+        self.temp_dir.cleanup()
+
+    def test_connection_is_reused(self):
+        """Test that the same connection is returned for the same path."""
+        first = database.get_connection(self.test_db_path)
+        second = database.get_connection(self.test_db_path)
+
+        self.assertIs(first, second)
+
+    def test_pragmas_are_applied(self):
+        """Test that new connections are configured for WAL mode."""
+        conn = database.get_connection(self.test_db_path)
+
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(synchronous, 1)  # NORMAL
+
+    def test_writes_are_visible_to_other_connections(self):
+        """Test that autocommit writes are visible without an explicit commit."""
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute('CREATE TABLE items (name TEXT)')
+            cursor.execute("INSERT INTO items VALUES ('first')")
+
+        conn = sqlite3.connect(self.test_db_path)
+        rows = conn.execute('SELECT name FROM items').fetchall()
+        conn.close()
+
+        self.assertEqual(rows, [('first',)])
+
+    def test_transaction_rolls_back_on_error(self):
+        """Test that a failing transaction leaves no partial writes."""
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute('CREATE TABLE items (name TEXT)')
+
+        with self.assertRaises(RuntimeError):
+            with database.transaction(self.test_db_path) as cursor:
+                cursor.execute("INSERT INTO items VALUES ('first')")
+                raise RuntimeError("Write failed")
+
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute('SELECT COUNT(*) FROM items')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_concurrent_use_from_threads(self):
+        """Test that the shared connection can be used from several threads."""
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute('CREATE TABLE items (name TEXT)')
+
+        def insert(name):
+            with database.cursor(self.test_db_path) as cursor:
+                cursor.execute('INSERT INTO items VALUES (?)', (name,))
+
+        threads = [threading.Thread(target=insert, args=(f'item {i}',)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute('SELECT COUNT(*) FROM items')
+            self.assertEqual(cursor.fetchone()[0], 10)
+
+    def test_init_schema_runs_once(self):
+        """Test that a schema script only runs once per connection."""
+        schema = 'CREATE TABLE items (name TEXT);'
+
+        # A plain CREATE TABLE would fail if it were executed twice
+        database.init_schema(self.test_db_path, schema)
+        database.init_schema(self.test_db_path, schema)
+
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            self.assertEqual(cursor.fetchall(), [('items',)])
+
+    def test_close_connection(self):
+        """Test that closing a connection opens a fresh one on next use."""
+        first = database.get_connection(self.test_db_path)
+        database.close_connection(self.test_db_path)
+        second = database.get_connection(self.test_db_path)
+
+        self.assertIsNot(first, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
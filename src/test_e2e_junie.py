@@ -4,9 +4,7 @@ import json
 import tempfile
 from unittest.mock import patch, MagicMock
 
-import sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
+import database
 from main import app
 
 class TestEndToEnd(unittest.TestCase):
@@ -49,42 +47,37 @@ class TestEndToEnd(unittest.TestCase):
         self.modules_patcher.stop()
         self.quizzes_patcher.stop()
         
-        # Remove temporary directory and files
+        # Close the shared connections, then remove temporary directory and files
+        database.close_all_connections()
         self.temp_dir.cleanup()
     
-    @patch('transcriber.whisper')
+    @patch('transcriber.load_audio')
+    @patch('transcriber.load_whisper_model')
     @patch('transcriber.yt_dlp.YoutubeDL')
-    @patch('modules.TitleGenerator')
-    @patch('quizzes.call_nebius_llm')
-    def test_complete_workflow(self, mock_call_nebius, mock_title_generator_class, mock_ytdl, mock_whisper):
+    @patch('modules.get_title_generator')
+    @patch('quizzes.call_nebius_llm_async')
+    def test_complete_workflow(self, mock_call_nebius, mock_get_title_generator, mock_ytdl, mock_load_whisper_model, mock_load_audio):
         """Test the complete workflow from video URL to quiz generation."""
         # Mock YoutubeDL extract_info
-        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120}
-        mock_ytdl_instance = MagicMock()
-        mock_ytdl_instance.extract_info.return_value = mock_info
-        mock_ytdl.return_value.__enter__.return_value = mock_ytdl_instance
+        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120, 'url': 'https://example.com/audio'}
+        mock_ytdl_instance = MagicMock(**{'extract_info.return_value': mock_info})
+        mock_ytdl.configure_mock(**{'return_value.__enter__.return_value': mock_ytdl_instance})
         
         # Mock whisper model
-        mock_model = MagicMock()
-        mock_model.transcribe.return_value = {
+        mock_model = MagicMock(**{'transcribe.return_value': {
             'segments': [
                 {'id': 1, 'text': 'This is the first segment.', 'start': 0, 'end': 10},
                 {'id': 2, 'text': 'This is the second segment.', 'start': 10, 'end': 20}
             ]
-        }
-        mock_whisper.load_model.return_value = mock_model
+        }})
+        mock_load_whisper_model.return_value = mock_model
         
         # Mock the TitleGenerator
-        mock_generator = MagicMock()
-        mock_generator.generate_title.return_value = "Generated Title"
-        mock_title_generator_class.return_value = mock_generator
+        mock_generator = MagicMock(**{'generate_titles.return_value': ["Generated Title"]})
+        mock_get_title_generator.return_value = mock_generator
         
         # Mock the Nebius LLM API
-        mock_response = json.dumps({
-            'choices': [
-                {
-                    'message': {
-                        'content': '''```json
+        mock_call_nebius.return_value = '''```json
 [
   {
     "question": "Test question?",
@@ -93,11 +86,6 @@ class TestEndToEnd(unittest.TestCase):
     "explanation": "Test explanation"
   }
 ]```'''
-                    }
-                }
-            ]
-        })
-        mock_call_nebius.return_value = mock_response
         
         # Step 1: Access the index page
         response = self.client.get('/')
@@ -127,19 +115,18 @@ class TestEndToEnd(unittest.TestCase):
         self.assertEqual(data['quiz'][0]['correct_answer'], "A")
         
         # Verify that all the mocks were called
-        mock_whisper.load_model.assert_called_once()
+        mock_load_whisper_model.assert_called_once()
         mock_model.transcribe.assert_called_once()
-        mock_generator.generate_title.assert_called_once()
+        mock_generator.generate_titles.assert_called_once()
         mock_call_nebius.assert_called_once()
     
-    @patch('transcriber.whisper')
+    @patch('transcriber.load_whisper_model')
     @patch('transcriber.yt_dlp.YoutubeDL')
-    def test_error_handling_invalid_video(self, mock_ytdl, mock_whisper):
+    def test_error_handling_invalid_video(self, mock_ytdl, mock_load_whisper_model):
         """Test error handling for invalid video URLs."""
         # Mock YoutubeDL to raise an exception
-        mock_ytdl_instance = MagicMock()
-        mock_ytdl_instance.extract_info.side_effect = Exception("Invalid URL")
-        mock_ytdl.return_value.__enter__.return_value = mock_ytdl_instance
+        mock_ytdl_instance = MagicMock(**{'extract_info.side_effect': Exception("Invalid URL")})
+        mock_ytdl.configure_mock(**{'return_value.__enter__.return_value': mock_ytdl_instance})
         
         # Request modules for an invalid video
         response = self.client.get('/modules?video_id=invalid_video_id')
@@ -153,39 +140,33 @@ class TestEndToEnd(unittest.TestCase):
         # Assert that the response contains an error message
         self.assertIn('error', data)
     
-    @patch('transcriber.whisper')
+    @patch('transcriber.load_audio')
+    @patch('transcriber.load_whisper_model')
     @patch('transcriber.yt_dlp.YoutubeDL')
-    @patch('modules.TitleGenerator')
-    @patch('quizzes.call_nebius_llm')
-    def test_caching_mechanism(self, mock_call_nebius, mock_title_generator_class, mock_ytdl, mock_whisper):
+    @patch('modules.get_title_generator')
+    @patch('quizzes.call_nebius_llm_async')
+    def test_caching_mechanism(self, mock_call_nebius, mock_get_title_generator, mock_ytdl, mock_load_whisper_model, mock_load_audio):
         """Test that the caching mechanism works correctly across the application."""
         # Mock YoutubeDL extract_info
-        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120}
-        mock_ytdl_instance = MagicMock()
-        mock_ytdl_instance.extract_info.return_value = mock_info
-        mock_ytdl.return_value.__enter__.return_value = mock_ytdl_instance
+        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120, 'url': 'https://example.com/audio'}
+        mock_ytdl_instance = MagicMock(**{'extract_info.return_value': mock_info})
+        mock_ytdl.configure_mock(**{'return_value.__enter__.return_value': mock_ytdl_instance})
         
         # Mock whisper model
-        mock_model = MagicMock()
-        mock_model.transcribe.return_value = {
+        mock_model = MagicMock(**{'transcribe.return_value': {
             'segments': [
                 {'id': 1, 'text': 'This is the first segment.', 'start': 0, 'end': 10},
                 {'id': 2, 'text': 'This is the second segment.', 'start': 10, 'end': 20}
             ]
-        }
-        mock_whisper.load_model.return_value = mock_model
+        }})
+        mock_load_whisper_model.return_value = mock_model
         
         # Mock the TitleGenerator
-        mock_generator = MagicMock()
-        mock_generator.generate_title.return_value = "Generated Title"
-        mock_title_generator_class.return_value = mock_generator
+        mock_generator = MagicMock(**{'generate_titles.return_value': ["Generated Title"]})
+        mock_get_title_generator.return_value = mock_generator
         
         # Mock the Nebius LLM API
-        mock_response = json.dumps({
-            'choices': [
-                {
-                    'message': {
-                        'content': '''```json
+        mock_call_nebius.return_value = '''```json
 [
   {
     "question": "Test question?",
@@ -194,11 +175,6 @@ class TestEndToEnd(unittest.TestCase):
     "explanation": "Test explanation"
   }
 ]```'''
-                    }
-                }
-            ]
-        })
-        mock_call_nebius.return_value = mock_response
         
         # First request to populate the cache
         response = self.client.get('/modules?video_id=test_vid_id')
@@ -211,9 +187,9 @@ class TestEndToEnd(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         
         # Reset the mock call counts
-        mock_whisper.load_model.reset_mock()
+        mock_load_whisper_model.reset_mock()
         mock_model.transcribe.reset_mock()
-        mock_generator.generate_title.reset_mock()
+        mock_generator.generate_titles.reset_mock()
         mock_call_nebius.reset_mock()
         
         # Second request should use cached data
@@ -224,9 +200,9 @@ class TestEndToEnd(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         
         # Verify that the mocks were not called again (using cached data)
-        mock_whisper.load_model.assert_not_called()
+        mock_load_whisper_model.assert_not_called()
         mock_model.transcribe.assert_not_called()
-        mock_generator.generate_title.assert_not_called()
+        mock_generator.generate_titles.assert_not_called()
         mock_call_nebius.assert_not_called()
 
 
@@ -1,101 +1,152 @@
 import unittest
-import os
-from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+from unittest.mock import patch
 
-import sys
-
-import pytest
-
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
 
+import database
 import transcriber
 import modules
 import quizzes
 
+# Video info, audio, transcript segments and quiz questions shared by the pipeline tests
+MOCK_INFO = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120, 'url': 'https://example.com/audio'}
+
+MOCK_AUDIO = np.zeros(transcriber.SAMPLE_RATE, dtype=np.float32)
+
+MOCK_SEGMENTS = [
+    {'id': 1, 'text': 'This is the first segment.', 'start': 0, 'end': 10},
+    {'id': 2, 'text': 'This is the second segment.', 'start': 10, 'end': 20}
+]
+
+MOCK_QUESTIONS = [
+    {
+        "question": "Test question?",
+        "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
+        "correct_answer": "A",
+        "explanation": "Test explanation"
+    }
+]
+
+
+class _YoutubeDLStub:
+    """Stands in for a yt_dlp.YoutubeDL context that reports fixed video info"""
+
+    def __init__(self, info):
+        self.info = info
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def extract_info(self, url, download=False):
+        return self.info
+
+
+def _whisper_model_stub(segments):
+    """Returns a stand-in Whisper model whose transcription has the given segments"""
+    return SimpleNamespace(transcribe=lambda audio, **kwargs: {'segments': segments})
+
+
+def _title_generator_stub(title):
+    """Returns a stand-in TitleGenerator that gives every chunk the same title"""
+    return SimpleNamespace(generate_titles=lambda texts: [title] * len(texts))
+
+
+def _course_designer_stub(questions):
+    """Returns a stand-in CourseDesignerAgent that generates the given questions"""
+    async def generate_quiz_questions_async(text, difficulty, num_questions=2):
+        return questions
+
+    return SimpleNamespace(
+        generate_quiz_questions=lambda text, difficulty, num_questions=2: questions,
+        generate_quiz_questions_async=generate_quiz_questions_async
+    )
+
+
 class TestModuleInteractions(unittest.TestCase):
     """Tests for the interactions between modules."""
     
-    def setUp(self):
-        """Set up test environment before each test."""
+    @classmethod
+    def setUpClass(cls):
+        """Set up the test databases once for all tests."""
         # Use in-memory databases for testing
-        self.transcriber_db_path = 'transcriptions.db'
-        self.modules_db_path = 'modules.db'
-        self.quizzes_db_path = 'quizzes.db'
+        cls.transcriber_db_path = 'file:transcriptions_integration_test?mode=memory&cache=shared'
+        cls.modules_db_path = 'file:modules_integration_test?mode=memory&cache=shared'
+        cls.quizzes_db_path = 'file:quizzes_integration_test?mode=memory&cache=shared'
         
-        # Save original paths
-        self.original_transcriber_path = transcriber.Transcriptions_CACHE_DB
-        self.original_modules_path = modules.MODULES_CACHE_DB
-        self.original_quizzes_path = quizzes.QUIZ_CACHE_DB
-        
-        # Set test paths
-        transcriber.Transcriptions_CACHE_DB = self.transcriber_db_path
-        modules.MODULES_CACHE_DB = self.modules_db_path
-        quizzes.QUIZ_CACHE_DB = self.quizzes_db_path
+        # Point the modules at the test databases, restoring the original
+        # paths after the last test
+        for patcher in (
+            patch.object(transcriber, 'Transcriptions_CACHE_DB', cls.transcriber_db_path),
+            patch.object(modules, 'MODULES_CACHE_DB', cls.modules_db_path),
+            patch.object(quizzes, 'QUIZ_CACHE_DB', cls.quizzes_db_path)
+        ):
+            patcher.start()
+            cls.addClassCleanup(patcher.stop)
         
         # Initialize databases
         transcriber.init_database()
         modules.init_course_cache()
-        quizzes.QuizCache(self.quizzes_db_path)
+        quizzes.QuizCache(cls.quizzes_db_path)
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test databases after all tests."""
+        # Close the shared connections, which discards the in-memory databases
+        database.close_connection(cls.transcriber_db_path)
+        database.close_connection(cls.modules_db_path)
+        database.close_connection(cls.quizzes_db_path)
     
     def tearDown(self):
-        """Clean up after each test."""
-        # Delete the test database files
-        if os.path.exists(self.transcriber_db_path):
-            os.remove(self.transcriber_db_path)
-        if os.path.exists(self.modules_db_path):
-            os.remove(self.modules_db_path)
-        if os.path.exists(self.quizzes_db_path):
-            os.remove(self.quizzes_db_path)
-        # Restore original paths
-        transcriber.Transcriptions_CACHE_DB = self.original_transcriber_path
-        modules.MODULES_CACHE_DB = self.original_modules_path
-        quizzes.QUIZ_CACHE_DB = self.original_quizzes_path
+        """Clear the rows written by each test, keeping the schema."""
+        with database.cursor(self.modules_db_path) as cursor:
+            cursor.execute('DELETE FROM course_modules')
+        with database.cursor(self.quizzes_db_path) as cursor:
+            cursor.execute('DELETE FROM module_questions')
+        with database.cursor(self.transcriber_db_path) as cursor:
+            cursor.execute('DELETE FROM transcriptions')
     
-    @patch('transcriber.whisper')
-    @patch('transcriber.yt_dlp.YoutubeDL')
-    def test_transcriber_to_modules_pipeline(self, mock_ytdl, mock_whisper):
+    def _stub_pipeline(self):
+        """
+        Replaces the video downloader, the audio decoder, Whisper, the title
+        generator and the quiz agent with stubs returning the shared mock data, for the current test
+        """
+        stubs = {
+            'transcriber.yt_dlp.YoutubeDL': lambda *args, **kwargs: _YoutubeDLStub(MOCK_INFO),
+            'transcriber.load_audio': lambda *args, **kwargs: MOCK_AUDIO,
+            'transcriber.load_whisper_model': lambda *args, **kwargs: _whisper_model_stub(MOCK_SEGMENTS),
+            'modules.get_title_generator': lambda: _title_generator_stub("Generated Title"),
+            'quizzes.CourseDesignerAgent': lambda: _course_designer_stub(MOCK_QUESTIONS)
+        }
+        for target, stub in stubs.items():
+            patcher = patch(target, new=stub)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def test_transcriber_to_modules_pipeline(self):
         """Test the pipeline from transcriber to modules."""
-        # Mock YoutubeDL extract_info
-        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120}
-        mock_ytdl_instance = MagicMock()
-        mock_ytdl_instance.extract_info.return_value = mock_info
-        mock_ytdl.return_value.__enter__.return_value = mock_ytdl_instance
+        self._stub_pipeline()
         
-        # Mock whisper model
-        mock_model = MagicMock()
-        mock_model.transcribe.return_value = {
-            'segments': [
-                {'id': 1, 'text': 'This is the first segment.', 'start': 0, 'end': 10},
-                {'id': 2, 'text': 'This is the second segment.', 'start': 10, 'end': 20}
-            ]
-        }
-        mock_whisper.load_model.return_value = mock_model
+        # Call the transcribe function
+        url = "https://www.youtube.com/watch?v=test_vid_id"
+        transcript = transcriber.transcribe_youtube_video(url)
         
-        # Mock the TitleGenerator to avoid actual model loading
-        with patch('modules.TitleGenerator') as mock_title_generator_class:
-            # Mock the TitleGenerator instance
-            mock_generator = MagicMock()
-            mock_generator.generate_title.return_value = "Generated Title"
-            mock_title_generator_class.return_value = mock_generator
-            
-            # Call the transcribe function
-            url = "https://www.youtube.com/watch?v=test_vid_id"
-            transcript = transcriber.transcribe_youtube_video(url)
-            
-            # Assert that the transcript was created correctly
-            self.assertIsNotNone(transcript)
-            self.assertEqual(transcript['title'], 'Test Video')
-            self.assertEqual(len(transcript['transcript']), 2)
-            
-            # Call the structure_transcript function with the transcript
-            result_modules = modules.structure_transcript(transcript)
-            
-            # Assert that the modules were created correctly
-            self.assertIsNotNone(result_modules)
-            self.assertEqual(len(result_modules), 1)  # All segments should be in one module (less than CHUNK_SIZE)
-            self.assertEqual(result_modules[0]['title'], "Generated Title")
-            self.assertEqual(len(result_modules[0]['content']), 2)
-
+        # Assert that the transcript was created correctly
+        self.assertIsNotNone(transcript)
+        self.assertEqual(transcript['title'], 'Test Video')
+        self.assertEqual(len(transcript['transcript']), 2)
+        
+        # Call the structure_transcript function with the transcript
+        result_modules = modules.structure_transcript(transcript)
+        
+        # Assert that the modules were created correctly
+        self.assertIsNotNone(result_modules)
+        self.assertEqual(len(result_modules), 1)  # All segments should be in one module (less than CHUNK_SIZE)
+        self.assertEqual(result_modules[0]['title'], "Generated Title")
+        self.assertEqual(len(result_modules[0]['content']), 2)
 
     @patch('modules.get_cached_modules')
     @patch('quizzes.CourseDesignerAgent')
@@ -112,75 +163,27 @@ class TestModuleInteractions(unittest.TestCase):
         ]
         mock_get_cached_modules.return_value = modules_data
         
-        # Mock CourseDesignerAgent to return test questions
-        mock_agent = MagicMock()
-        mock_agent_class.return_value = mock_agent
-        
-        questions = [
-            {
-                "question": "Test question?",
-                "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
-                "correct_answer": "A",
-                "explanation": "Test explanation"
-            }
-        ]
-        mock_agent.generate_quiz_questions.return_value = questions
+        # Stub CourseDesignerAgent to return test questions
+        mock_agent_class.return_value = _course_designer_stub(MOCK_QUESTIONS)
 
-        with pytest.raises(ValueError, match="No modules found in cache"):
+        with self.assertRaisesRegex(ValueError, "No modules found in cache"):
             # Call the generate_all_module_quizzes function
             result = quizzes.generate_all_module_quizzes("test_vid_id", "medium")
 
-    @patch('transcriber.whisper')
-    @patch('transcriber.yt_dlp.YoutubeDL')
-    @patch('modules.TitleGenerator')
-    @patch('quizzes.CourseDesignerAgent')
-    def test_full_pipeline(self, mock_agent_class, mock_title_generator_class, mock_ytdl, mock_whisper):
+    def test_full_pipeline(self):
         """Test the full pipeline from video URL to quiz generation."""
-        # Mock YoutubeDL extract_info
-        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120}
-        mock_ytdl_instance = MagicMock()
-        mock_ytdl_instance.extract_info.return_value = mock_info
-        mock_ytdl.return_value.__enter__.return_value = mock_ytdl_instance
-        
-        # Mock whisper model
-        mock_model = MagicMock()
-        mock_model.transcribe.return_value = {
-            'segments': [
-                {'id': 1, 'text': 'This is the first segment.', 'start': 0, 'end': 10},
-                {'id': 2, 'text': 'This is the second segment.', 'start': 10, 'end': 20}
-            ]
-        }
-        mock_whisper.load_model.return_value = mock_model
-        
-        # Mock the TitleGenerator
-        mock_generator = MagicMock()
-        mock_generator.generate_title.return_value = "Generated Title"
-        mock_title_generator_class.return_value = mock_generator
-        
-        # Mock CourseDesignerAgent
-        mock_agent = MagicMock()
-        mock_agent_class.return_value = mock_agent
-        
-        questions = [
-            {
-                "question": "Test question?",
-                "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
-                "correct_answer": "A",
-                "explanation": "Test explanation"
-            }
-        ]
-        mock_agent.generate_quiz_questions.return_value = questions
+        self._stub_pipeline()
         
         # Step 1: Transcribe the video
         url = "https://www.youtube.com/watch?v=test_vid_id"
         transcript = transcriber.transcribe_youtube_video(url)
         
-        # Step 2: Structure the transcript into modules
+        # Step 2: Structure the transcript into modules, which caches them for get_quiz
         result_modules = modules.structure_transcript(transcript)
+        self.assertEqual([module['title'] for module in result_modules], ["Generated Title"])
         
         # Step 3: Generate quizzes for the modules
-        module_title = result_modules[0]['title']
-        result_quiz = quizzes.get_quiz("test_vid_id", module_title, "medium")
+        result_quiz = quizzes.get_quiz("test_vid_id", "Generated Title", "medium")
         
         # Assert that the final quiz was created correctly
         self.assertIsNotNone(result_quiz)
@@ -0,0 +1,181 @@
+import asyncio
+import unittest
+import sqlite3
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch, AsyncMock
+
+import database
+import llm
+from llm import (
+    init_llm_cache,
+    get_cache_key,
+    get_cached_response,
+    save_response_to_cache,
+    call_nebius_llm,
+    call_nebius_llm_async
+)
+
+
+# Chat completion returned by the mocked clients, shared by all tests
+_FAKE_COMPLETION = SimpleNamespace(
+    choices=[SimpleNamespace(message=SimpleNamespace(content="Test response"))]
+)
+
+
+class TestLLMCacheDatabaseOperations(unittest.TestCase):
+    """Tests for the database operations in the LLM module."""
+
+    def setUp(self):
+        """Set up test environment before each test."""
+        # Keep the test database in a fresh temporary directory
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_db_path = os.path.join(self.temp_dir.name, 'llm_cache.db')
+        self.original_path = llm.LLM_CACHE_DB
+        llm.LLM_CACHE_DB = self.test_db_path
+
+    def tearDown(self):
+        """Clean up after each test."""
+        # Close the shared connection and remove the temporary directory
+        database.close_connection(self.test_db_path)
+        self.temp_dir.cleanup()
+
+        # Restore the original database path
+        llm.LLM_CACHE_DB = self.original_path
+
+    def test_init_llm_cache(self):
+        """Test that init_llm_cache creates the correct schema."""
+        # Initialize the database
+        init_llm_cache()
+
+        # Connect to the database and check the table columns
+        conn = sqlite3.connect(self.test_db_path)
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(llm_cache)")
+        column_names = [column[1] for column in cursor.fetchall()]
+        conn.close()
+
+        # Assert that all expected columns exist
+        for column in ['key', 'response', 'created_at']:
+            self.assertIn(column, column_names, f"Column {column} is missing from the llm_cache table")
+
+    def test_get_cache_key(self):
+        """Test that cache keys depend on both the model and the prompt."""
+        key = get_cache_key("model-a", "Prompt")
+
+        self.assertEqual(key, get_cache_key("model-a", "Prompt"))
+        self.assertNotEqual(key, get_cache_key("model-b", "Prompt"))
+        self.assertNotEqual(key, get_cache_key("model-a", "Other prompt"))
+
+    def test_save_and_get_cached_response(self):
+        """Test that a saved response can be retrieved."""
+        init_llm_cache()
+        key = get_cache_key("model-a", "Prompt")
+
+        self.assertIsNone(get_cached_response(key))
+
+        save_response_to_cache(key, "Test response")
+
+        self.assertEqual(get_cached_response(key), "Test response")
+
+
+class TestCallNebiusLLM(unittest.TestCase):
+    """Tests for the cached LLM call in the LLM module."""
+
+    def setUp(self):
+        """Set up test environment before each test."""
+        # Keep the test database in a fresh temporary directory
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_db_path = os.path.join(self.temp_dir.name, 'llm_cache.db')
+        self.original_path = llm.LLM_CACHE_DB
+        llm.LLM_CACHE_DB = self.test_db_path
+
+    def tearDown(self):
+        """Clean up after each test."""
+        # Close the shared connection and remove the temporary directory
+        database.close_connection(self.test_db_path)
+        self.temp_dir.cleanup()
+
+        # Restore the original database path
+        llm.LLM_CACHE_DB = self.original_path
+
+    @patch('llm.client')
+    def test_call_nebius_llm(self, mock_client):
+        """Test call_nebius_llm with mocked API."""
+        # Mock the OpenAI client response
+        mock_client.chat.completions.create.return_value = _FAKE_COMPLETION
+
+        # Call the function
+        result = call_nebius_llm(prompt="Test prompt")
+
+        # Assert that the result is the expected response
+        self.assertEqual(result, "Test response")
+
+        # Verify that the client was called with the correct parameters
+        mock_client.chat.completions.create.assert_called_once()
+        call_args = mock_client.chat.completions.create.call_args[1]
+        self.assertEqual(call_args['model'], "deepseek-ai/DeepSeek-R1")
+        self.assertEqual(call_args['messages'][0]['content'], "Test prompt")
+
+    @patch('llm.client')
+    def test_call_nebius_llm_uses_cache(self, mock_client):
+        """Test that repeated identical calls are answered from the cache."""
+        # Mock the OpenAI client response
+        mock_client.chat.completions.create.return_value = _FAKE_COMPLETION
+
+        # Call the function twice with the same model and prompt
+        first = call_nebius_llm("test-model", "Test prompt")
+        second = call_nebius_llm(model="test-model", prompt="Test prompt")
+
+        # Assert that the API was only called once
+        self.assertEqual(first, second)
+        mock_client.chat.completions.create.assert_called_once()
+
+        # A different prompt is not a cache hit
+        call_nebius_llm("test-model", "Other prompt")
+        self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+
+    @patch('llm.client')
+    def test_call_nebius_llm_error_handling(self, mock_client):
+        """Test error handling in call_nebius_llm."""
+        # Mock the OpenAI client to raise an exception
+        mock_client.chat.completions.create.side_effect = Exception("API Error")
+
+        # Call the function
+        result = call_nebius_llm(prompt="Test prompt")
+
+        # Assert that the function returns None on error
+        self.assertIsNone(result)
+
+        # Failed calls are not cached
+        result = call_nebius_llm(prompt="Test prompt")
+        self.assertIsNone(result)
+        self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+
+    @patch('llm.async_client')
+    def test_call_nebius_llm_async(self, mock_async_client):
+        """Test call_nebius_llm_async with mocked API."""
+        # Mock the AsyncOpenAI client response
+        mock_async_client.chat.completions.create = AsyncMock(return_value=_FAKE_COMPLETION)
+
+        # Call the function
+        result = asyncio.run(call_nebius_llm_async(prompt="Test prompt"))
+
+        # Assert that the result is the expected response
+        self.assertEqual(result, "Test response")
+
+        # Verify that the client was called with the correct parameters
+        mock_async_client.chat.completions.create.assert_awaited_once()
+        call_args = mock_async_client.chat.completions.create.call_args[1]
+        self.assertEqual(call_args['model'], "deepseek-ai/DeepSeek-R1")
+        self.assertEqual(call_args['messages'][0]['content'], "Test prompt")
+
+        # A repeated call is answered from the cache
+        result = asyncio.run(call_nebius_llm_async(prompt="Test prompt"))
+        self.assertEqual(result, "Test response")
+        mock_async_client.chat.completions.create.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
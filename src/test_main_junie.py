@@ -1,21 +1,21 @@
 import unittest
-import json
 from unittest.mock import patch
 
 import sys
 import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import subprocess
 
 from main import app
 
 class TestFlaskApplication(unittest.TestCase):
     """Tests for the Flask application routes."""
     
-    def setUp(self):
-        """Set up a test environment before each test."""
+    @classmethod
+    def setUpClass(cls):
+        """Set up a test client shared by all tests."""
         # Configure the Flask app for testing
         app.config['TESTING'] = True
-        self.client = app.test_client()
+        cls.client = app.test_client()
     
     def test_index_route(self):
         """Test that the index route returns the correct template."""
@@ -42,10 +42,24 @@ class TestFlaskApplication(unittest.TestCase):
         
         # Check that the start time is included in the response
         self.assertIn(b'start=30', response.data)
+
+    def test_heavy_modules_not_imported_at_startup(self):
+        """Test that importing the app does not import the transcriber, modules or quizzes."""
+        # Use a fresh interpreter, since other tests have already imported them
+        script = (
+            "import sys, main; "
+            "print(any(name in sys.modules for name in ('transcriber', 'modules', 'quizzes')))"
+        )
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'False')
     
-    @patch('main.transcribe_youtube_video')
-    @patch('main.structure_transcript')
-    def test_modules_route_success(self, mock_structure, mock_transcribe):
+    @patch('modules.get_cached_modules', return_value=None)
+    @patch('transcriber.transcribe_youtube_video')
+    @patch('modules.structure_transcript')
+    def test_modules_route_success(self, mock_structure, mock_transcribe, mock_get_cached):
         """Test that the modules route returns structured modules."""
         # Mock the transcribe_youtube_video function
         mock_transcript = {
@@ -72,15 +86,44 @@ class TestFlaskApplication(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         
         # Parse the JSON response
-        data = json.loads(response.data)
+        data = response.get_json()
         
         # Assert that the response contains the expected modules
         self.assertIn('modules', data)
         self.assertEqual(data['modules'], mock_modules)
         
         # Verify that the functions were called with the correct parameters
+        mock_get_cached.assert_called_once_with('test_video_id')
         mock_transcribe.assert_called_once_with('https://www.youtube.com/watch?v=test_video_id')
         mock_structure.assert_called_once_with(mock_transcript)
+
+    @patch('modules.get_cached_modules')
+    @patch('transcriber.transcribe_youtube_video')
+    @patch('modules.structure_transcript')
+    def test_modules_route_cached(self, mock_structure, mock_transcribe, mock_get_cached):
+        """Test that the modules route skips transcription when modules are cached."""
+        # Mock the get_cached_modules function to return cached data
+        cached_modules = [
+            {
+                'title': 'Cached Module',
+                'content': [{'text': 'Cached content'}],
+                'start_time': 0,
+                'end_time': 10
+            }
+        ]
+        mock_get_cached.return_value = cached_modules
+
+        # Make a request to the modules route
+        response = self.client.get('/modules?video_id=test_video_id')
+
+        # Assert that the cached modules are returned
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['modules'], cached_modules)
+
+        # Verify that the video was neither transcribed nor structured
+        mock_transcribe.assert_not_called()
+        mock_structure.assert_not_called()
     
     def test_modules_route_missing_video_id(self):
         """Test that the modules route handles missing video ID."""
@@ -91,14 +134,15 @@ class TestFlaskApplication(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         
         # Parse the JSON response
-        data = json.loads(response.data)
+        data = response.get_json()
         
         # Assert that the response contains an error message
         self.assertIn('error', data)
         self.assertEqual(data['error'], 'Video ID is required')
     
-    @patch('main.transcribe_youtube_video')
-    def test_modules_route_transcription_error(self, mock_transcribe):
+    @patch('modules.get_cached_modules', return_value=None)
+    @patch('transcriber.transcribe_youtube_video')
+    def test_modules_route_transcription_error(self, mock_transcribe, mock_get_cached):
         """Test that the modules route handles transcription errors."""
         # Mock the transcribe_youtube_video function to raise an exception
         mock_transcribe.side_effect = Exception("Transcription error")
@@ -110,13 +154,13 @@ class TestFlaskApplication(unittest.TestCase):
         self.assertEqual(response.status_code, 500)
         
         # Parse the JSON response
-        data = json.loads(response.data)
+        data = response.get_json()
         
         # Assert that the response contains an error message
         self.assertIn('error', data)
         self.assertEqual(data['error'], 'Transcription error')
     
-    @patch('main.get_quiz')
+    @patch('quizzes.get_quiz')
     def test_generate_quiz_route_success(self, mock_get_quiz):
         """Test that the generate_quiz route returns a quiz."""
         # Mock the get_quiz function
@@ -137,7 +181,7 @@ class TestFlaskApplication(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         
         # Parse the JSON response
-        data = json.loads(response.data)
+        data = response.get_json()
         
         # Assert that the response contains the expected quiz
         self.assertIn('quiz', data)
@@ -155,7 +199,7 @@ class TestFlaskApplication(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         
         # Parse the JSON response
-        data = json.loads(response.data)
+        data = response.get_json()
         
         # Assert that the response contains an error message
         self.assertIn('error', data)
@@ -169,7 +213,7 @@ class TestFlaskApplication(unittest.TestCase):
         response = self.client.get('/generate_quiz?module_title=Test%20Module')
         self.assertEqual(response.status_code, 400)
     
-    @patch('main.get_quiz')
+    @patch('quizzes.get_quiz')
     def test_generate_quiz_route_error(self, mock_get_quiz):
         """Test that the generate_quiz route handles errors."""
         # Mock the get_quiz function to raise an exception
@@ -182,7 +226,7 @@ class TestFlaskApplication(unittest.TestCase):
         self.assertEqual(response.status_code, 500)
         
         # Parse the JSON response
-        data = json.loads(response.data)
+        data = response.get_json()
         
         # Assert that the response contains an error message
         self.assertIn('error', data)
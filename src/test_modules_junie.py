@@ -1,12 +1,9 @@
 import unittest
-import sqlite3
-import os
-import json
 from unittest.mock import patch, MagicMock
 
-import sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import orjson
 
+import database
 import modules
 from modules import (
     init_course_cache,
@@ -14,47 +11,43 @@ from modules import (
     save_modules_to_cache,
     extract_video_id,
     structure_transcript,
-    TitleGenerator,
-    generate_module_title
+    get_title_generator,
+    generate_module_title,
+    generate_module_titles_batch
 )
 
+# Shared-cache in-memory database. It lives as long as the shared connection
+# opened by the database module, so closing that connection discards it.
+TEST_DB_URI = 'file:modules_test?mode=memory&cache=shared'
+
 class TestModulesDatabaseOperations(unittest.TestCase):
     """Tests for the database operations in the Modules module."""
 
     def setUp(self):
         """Set up test environment before each test."""
-        self.test_db_path = 'modules.db'
-        self.original_path = modules.MODULES_CACHE_DB
-        modules.MODULES_CACHE_DB = self.test_db_path
+        # Use an in-memory database for testing, passed to the cache functions
+        self.test_db_path = TEST_DB_URI
 
     def tearDown(self):
         """Clean up after each test."""
-        # Delete the test database file
-        if os.path.exists(self.test_db_path):
-            os.remove(self.test_db_path)
-
-        # Restore the original database path
-        modules.MODULES_CACHE_DB = self.original_path
+        # Close the shared connection, which discards the in-memory database
+        database.close_connection(self.test_db_path)
 
     def test_init_course_cache(self):
         """Test that init_course_cache creates the correct schema."""
         # Initialize the database
-        init_course_cache()
-
-        # Connect to the database and check if the table exists
-        conn = sqlite3.connect(self.test_db_path)
-        cursor = conn.cursor()
+        init_course_cache(self.test_db_path)
 
-        # Query to check if the table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='course_modules'")
-        table_exists = cursor.fetchone() is not None
+        # Check if the table exists on the shared connection
+        with database.cursor(self.test_db_path) as cursor:
+            # Query to check if the table exists
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='course_modules'")
+            table_exists = cursor.fetchone() is not None
 
-        # Check if the table has the correct columns
-        cursor.execute("PRAGMA table_info(course_modules)")
-        columns = cursor.fetchall()
-        column_names = [column[1] for column in columns]
-
-        conn.close()
+            # Check if the table has the correct columns
+            cursor.execute("PRAGMA table_info(course_modules)")
+            columns = cursor.fetchall()
+            column_names = [column[1] for column in columns]
 
         # Assert that the table exists
         self.assertTrue(table_exists, "The course_modules table was not created")
@@ -67,11 +60,7 @@ class TestModulesDatabaseOperations(unittest.TestCase):
     def test_get_cached_modules(self):
         """Test that get_cached_modules retrieves correct data."""
         # Initialize the database
-        init_course_cache()
-
-        # Connect to the database and insert test data
-        conn = sqlite3.connect(self.test_db_path)
-        cursor = conn.cursor()
+        init_course_cache(self.test_db_path)
 
         # Test data
         video_id = "test_vid_id"
@@ -84,16 +73,15 @@ class TestModulesDatabaseOperations(unittest.TestCase):
             }
         ]
 
-        # Insert test data
-        cursor.execute(
-            "INSERT INTO course_modules (video_id, modules, created_at) VALUES (?, ?, datetime('now'))",
-            (video_id, json.dumps(modules_data))
-        )
-        conn.commit()
-        conn.close()
+        # Insert test data on the shared connection the cache functions use
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute(
+                "INSERT INTO course_modules (video_id, modules, created_at) VALUES (?, ?, datetime('now'))",
+                (video_id, orjson.dumps(modules_data))
+            )
 
         # Retrieve the data using the function
-        result = get_cached_modules(video_id)
+        result = get_cached_modules(video_id, self.test_db_path)
 
         # Assert that the result matches the test data
         self.assertIsNotNone(result, "No result returned from get_cached_modules")
@@ -106,7 +94,7 @@ class TestModulesDatabaseOperations(unittest.TestCase):
     def test_save_modules_to_cache(self):
         """Test that save_modules_to_cache saves data correctly."""
         # Initialize the database
-        init_course_cache()
+        init_course_cache(self.test_db_path)
 
         # Test data
         video_id = "test_vid_id"
@@ -120,18 +108,16 @@ class TestModulesDatabaseOperations(unittest.TestCase):
         ]
 
         # Save the data using the function
-        save_modules_to_cache(video_id, modules_data)
+        save_modules_to_cache(video_id, modules_data, self.test_db_path)
 
-        # Connect to the database and retrieve the saved data
-        conn = sqlite3.connect(self.test_db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT modules FROM course_modules WHERE video_id = ?", (video_id,))
-        result = cursor.fetchone()
-        conn.close()
+        # Retrieve the saved data on the shared connection
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute("SELECT modules FROM course_modules WHERE video_id = ?", (video_id,))
+            result = cursor.fetchone()
 
         # Assert that the saved data matches the test data
         self.assertIsNotNone(result, "No data was saved to the database")
-        saved_modules = json.loads(result[0])
+        saved_modules = orjson.loads(result[0])
         self.assertEqual(len(saved_modules), 1)
         self.assertEqual(saved_modules[0]['title'], modules_data[0]['title'])
         self.assertEqual(saved_modules[0]['content'], modules_data[0]['content'])
@@ -142,24 +128,29 @@ class TestModulesDatabaseOperations(unittest.TestCase):
 class TestModuleStructuring(unittest.TestCase):
     """Tests for the module structuring functions in the Modules module."""
 
-    def setUp(self):
-        """Set up test environment before each test."""
+    @classmethod
+    def setUpClass(cls):
+        """Set up the test database once for all tests."""
         # Use an in-memory database for testing
-        self.test_db_path = 'modules.db'
-        self.original_path = modules.MODULES_CACHE_DB
-        modules.MODULES_CACHE_DB = self.test_db_path
+        cls.test_db_path = TEST_DB_URI
+        patcher = patch.object(modules, 'MODULES_CACHE_DB', cls.test_db_path)
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
 
-        # Initialize the database
+        # Initialize the database. The schema is only created once per
+        # connection, so the calls made by the cache functions are no-ops.
         init_course_cache()
 
-    def tearDown(self):
-        """Clean up after each test."""
-        # Delete the test database file
-        if os.path.exists(self.test_db_path):
-            os.remove(self.test_db_path)
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up after all tests."""
+        # Close the shared connection, which discards the in-memory database
+        database.close_connection(cls.test_db_path)
 
-        # Restore the original database path
-        modules.MODULES_CACHE_DB = self.original_path
+    def tearDown(self):
+        """Clear the modules cached by each test, keeping the schema."""
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute('DELETE FROM course_modules')
 
     def test_extract_video_id(self):
         """Test extract_video_id with various URL formats."""
@@ -179,11 +170,26 @@ class TestModuleStructuring(unittest.TestCase):
         url = "https://example.com"
         self.assertIsNone(extract_video_id(url))
 
-    @patch('modules.generate_module_title')
-    def test_structure_transcript(self, mock_generate_title):
+    def test_extract_video_id_batch(self):
+        """Test extract_video_id over a large batch of URLs in every supported format."""
+        url_formats = [
+            "https://www.youtube.com/watch?v={}",
+            "https://www.youtube.com/watch?feature=share&v={}&t=30",
+            "https://www.youtube.com/embed/{}",
+            "https://www.youtube-nocookie.com/embed/{}?start=10",
+            "https://www.youtube.com/shorts/{}",
+            "https://youtu.be/{}"
+        ]
+        video_ids = [f"vid{i:08d}" for i in range(10000)]
+        urls = [url_formats[i % len(url_formats)].format(video_id) for i, video_id in enumerate(video_ids)]
+
+        self.assertEqual([extract_video_id(url) for url in urls], video_ids)
+
+    @patch('modules.generate_module_titles_batch')
+    def test_structure_transcript(self, mock_generate_titles):
         """Test structure_transcript correctly divides content."""
-        # Mock the generate_module_title function
-        mock_generate_title.return_value = "Test Module Title"
+        # Mock the generate_module_titles_batch function
+        mock_generate_titles.side_effect = lambda contents: ["Test Module Title"] * len(contents)
 
         # Create a test transcript
         transcript = {
@@ -208,13 +214,68 @@ class TestModuleStructuring(unittest.TestCase):
         # Check first module
         self.assertEqual(result[0]['title'], "Test Module Title")
         self.assertEqual(result[0]['start_time'], 0)
+        self.assertEqual(result[0]['end_time'], 30)
         self.assertEqual(len(result[0]['content']), 3)
 
         # Check second module
         self.assertEqual(result[1]['title'], "Test Module Title")
         self.assertEqual(result[1]['start_time'], 600)
+        self.assertEqual(result[1]['end_time'], 620)
         self.assertEqual(len(result[1]['content']), 2)
 
+        # Verify that all titles were requested in a single batch
+        mock_generate_titles.assert_called_once()
+
+    @patch('modules.generate_module_titles_batch')
+    def test_structure_transcript_chunk_boundaries(self, mock_generate_titles):
+        """Test that each module spans CHUNK_SIZE seconds from its own first entry."""
+        mock_generate_titles.side_effect = lambda contents: ["Test Module Title"] * len(contents)
+
+        transcript = {
+            'embed_url': 'https://www.youtube.com/embed/test_vid_id',
+            'transcript': [
+                {'id': 1, 'text': 'Content 1', 'start': 0, 'end': 10},
+                {'id': 2, 'text': 'Content 2', 'start': 599.5, 'end': 605},
+                # Starts a module that runs until 1250 seconds
+                {'id': 3, 'text': 'Content 3', 'start': 650, 'end': 660},
+                {'id': 4, 'text': 'Content 4', 'start': 1200, 'end': 1210},
+                # Exactly CHUNK_SIZE seconds after the previous module start
+                {'id': 5, 'text': 'Content 5', 'start': 1250, 'end': 1260}
+            ]
+        }
+
+        result = structure_transcript(transcript)
+
+        self.assertEqual([module['start_time'] for module in result], [0, 650, 1250])
+        self.assertEqual([len(module['content']) for module in result], [2, 2, 1])
+
+    @patch('modules.generate_module_titles_batch')
+    def test_structure_transcript_unsorted_starts(self, mock_generate_titles):
+        """Test that out-of-order or missing start times still split the whole transcript."""
+        mock_generate_titles.side_effect = lambda contents: ["Test Module Title"] * len(contents)
+
+        cases = {
+            'out_of_order': [0, 700, 650, 10],
+            'nan': [0, float('nan'), 10]
+        }
+        for name, starts in cases.items():
+            with self.subTest(name):
+                transcript = {
+                    'embed_url': f'https://www.youtube.com/embed/{name}',
+                    'transcript': [
+                        {'id': i, 'text': f'Content {i}', 'start': start, 'end': 0}
+                        for i, start in enumerate(starts)
+                    ]
+                }
+
+                result = structure_transcript(transcript)
+
+                # Every entry lands in exactly one non-empty module, in order
+                contents = [module['content'] for module in result]
+                self.assertTrue(all(contents))
+                self.assertEqual([entry['id'] for content in contents for entry in content],
+                                 list(range(len(starts))))
+
     @patch('modules.get_cached_modules')
     def test_caching_mechanism(self, mock_get_cached):
         """Test that the caching mechanism works correctly."""
@@ -250,13 +311,12 @@ class TestModuleStructuring(unittest.TestCase):
 class TestTitleGeneration(unittest.TestCase):
     """Tests for the title generation functions in the Modules module."""
 
-    @patch('modules.TitleGenerator')
-    def test_generate_module_title(self, mock_title_generator_class):
+    @patch('modules.get_title_generator')
+    def test_generate_module_title(self, mock_get_title_generator):
         """Test generate_module_title with various inputs."""
-        # Mock the TitleGenerator class
-        mock_generator = MagicMock()
-        mock_generator.generate_title.return_value = "Generated Title"
-        mock_title_generator_class.return_value = mock_generator
+        # Mock the shared TitleGenerator
+        mock_generator = MagicMock(**{'generate_title.return_value': "Generated Title"})
+        mock_get_title_generator.return_value = mock_generator
 
         # Test data
         content = [
@@ -274,14 +334,15 @@ class TestTitleGeneration(unittest.TestCase):
         expected_text = 'This is the first sentence. This is the second sentence.'
         mock_generator.generate_title.assert_called_once_with(expected_text[:1024])
 
-    @patch('modules.TitleGenerator')
-    def test_fallback_mechanism(self, mock_title_generator_class):
+    @patch('modules.get_title_generator')
+    def test_fallback_mechanism(self, mock_get_title_generator):
         """Test fallback mechanism when model fails."""
-        # Mock the TitleGenerator class to simulate a failure
-        mock_generator = MagicMock()
-        mock_generator.generate_title.return_value = None
-        mock_generator.model = None  # Simulate model loading failure
-        mock_title_generator_class.return_value = mock_generator
+        # Mock the shared TitleGenerator to simulate a failure
+        mock_generator = MagicMock(**{
+            'generate_title.return_value': None,
+            'model': None  # Simulate model loading failure
+        })
+        mock_get_title_generator.return_value = mock_generator
 
         # Test data
         content = [
@@ -294,6 +355,89 @@ class TestTitleGeneration(unittest.TestCase):
         # Assert that the result is the fallback title
         self.assertEqual(result, 'This is a test sentence.')
 
+        # Test that long content is cut down to its first 10 words
+        content = [
+            {'text': 'One two three four five six seven'},
+            {'text': 'eight nine ten eleven twelve'}
+        ]
+        result = generate_module_title(content)
+        self.assertEqual(result, 'One two three four five six seven eight nine ten...')
+
+    @patch('modules.get_title_generator')
+    def test_generate_module_titles_batch(self, mock_get_title_generator):
+        """Test generate_module_titles_batch requests all titles at once."""
+        # Mock the shared TitleGenerator
+        mock_generator = MagicMock(**{'generate_titles.return_value': ["first title.", "second title"]})
+        mock_get_title_generator.return_value = mock_generator
+
+        # Test data
+        contents = [
+            [{'text': 'First chunk.'}, {'text': 'More of it.'}],
+            [{'text': 'Second chunk.'}]
+        ]
+
+        # Call the function
+        result = generate_module_titles_batch(contents)
+
+        # Assert that the titles are cleaned up and in order
+        self.assertEqual(result, ["First Title", "Second Title"])
+
+        # Verify that a single request was made with the joined chunk texts
+        mock_generator.generate_titles.assert_called_once_with(
+            ['First chunk. More of it.', 'Second chunk.']
+        )
+        mock_generator.generate_title.assert_not_called()
+
+    @patch('modules.get_title_generator')
+    def test_generate_module_titles_batch_fallback(self, mock_get_title_generator):
+        """Test per-module fallback when the batched response is unusable."""
+        # Mock the shared TitleGenerator to return too few titles
+        mock_generator = MagicMock(**{
+            'generate_titles.return_value': None,
+            'generate_title.return_value': "Generated Title"
+        })
+        mock_get_title_generator.return_value = mock_generator
+
+        # Test data
+        contents = [
+            [{'text': 'First chunk.'}],
+            [{'text': 'Second chunk.'}]
+        ]
+
+        # Call the function
+        result = generate_module_titles_batch(contents)
+
+        # Assert that each title was generated separately
+        self.assertEqual(result, ["Generated Title", "Generated Title"])
+        self.assertEqual(mock_generator.generate_title.call_count, 2)
+
+    def test_get_title_generator_is_shared(self):
+        """Test that the same TitleGenerator is reused across calls."""
+        generator = get_title_generator()
+
+        self.assertIsInstance(generator, modules.TitleGenerator)
+        self.assertIs(get_title_generator(), generator)
+
+    @patch('modules.call_nebius_llm')
+    def test_title_generator_generate_titles(self, mock_call_nebius):
+        """Test TitleGenerator.generate_titles parses a JSON array response."""
+        # Mock the API response
+        mock_call_nebius.return_value = 'Here you go:\n["Intro To Python", "Using Lists"]'
+
+        # Call the function
+        result = modules.TitleGenerator().generate_titles(['Chunk one', 'Chunk two'])
+
+        # Assert that the titles were extracted in order
+        self.assertEqual(result, ["Intro To Python", "Using Lists"])
+
+        # Verify that both chunks were numbered in the prompt
+        prompt = mock_call_nebius.call_args[1]['prompt']
+        self.assertIn("Chunk 1:\nChunk one", prompt)
+        self.assertIn("Chunk 2:\nChunk two", prompt)
+
+        # A response with the wrong number of titles is rejected
+        self.assertIsNone(modules.TitleGenerator().generate_titles(['Only one chunk', 'Another', 'Third']))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,17 +1,20 @@
+import asyncio
+import re
+import threading
 import unittest
 import sqlite3
-import os
-import json
-from unittest.mock import patch, MagicMock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, MagicMock, AsyncMock
 
-import sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import orjson
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
+import database
+import llm
 import quizzes
 from quizzes import (
     QuizCache,
     get_module_text,
-    call_nebius_llm,
     CourseDesignerAgent,
     get_quiz,
     generate_all_module_quizzes,
@@ -19,21 +22,94 @@ from quizzes import (
     setup_logging
 )
 
+
+# Expected structure of the prompt built by gen_prompt("Test text", "easy", 3)
+_PROMPT_RE = re.compile(
+    r'\ACreate 3 easy multiple-choice questions'
+    r'.*Format question as JSON array'
+    r'.*"options": \{"A": "Static typing"'
+    r'.*Text: Test text\s*\Z',
+    re.S
+)
+
+# Quiz questions shared by the tests, which only read them
+_SAMPLE_QUESTIONS = [
+    {
+        "question": "Test question?",
+        "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
+        "correct_answer": "A",
+        "explanation": "Test explanation"
+    }
+]
+
+
+def _bulk_insert_quizzes(conn, rows):
+    """
+    Inserts (video_id, module_title, difficulty, questions) rows
+    into the module_questions table in a single transaction.
+
+    The connection must be in autocommit mode, so that the write lock is
+    taken once by BEGIN IMMEDIATE rather than upgraded on the first insert.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany(
+            "INSERT INTO module_questions (video_id, module_title, difficulty, questions, created_at) VALUES (?, ?, ?, ?, datetime('now'))",
+            rows
+        )
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+class _ChatCompletionHandler(BaseHTTPRequestHandler):
+    """
+    Answers every chat completion request with the sample questions, recording
+    the client address of each request on the server
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.client_addresses.append(self.client_address)
+
+        content = f"```json\n{orjson.dumps(_SAMPLE_QUESTIONS).decode()}\n```"
+        body = orjson.dumps({
+            'id': 'chatcmpl-test',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': 'test-model',
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content}
+            }]
+        })
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
 class TestQuizCacheDatabaseOperations(unittest.TestCase):
     """Tests for the database operations in the Quizzes module."""
 
     def setUp(self):
         """Set up a test environment before each test."""
-        # Use an in-memory database for testing
-        self.test_db_path = 'quizes.db'
+        # Use a shared-cache in-memory database named after the test
+        self.test_db_path = f'file:quiz_{self.id()}?mode=memory&cache=shared'
         self.original_path = quizzes.QUIZ_CACHE_DB
         quizzes.QUIZ_CACHE_DB = self.test_db_path
 
     def tearDown(self):
         """Clean up after each test."""
-        # Delete the test database file
-        if os.path.exists(self.test_db_path):
-            os.remove(self.test_db_path)
+        # Closing the shared connection discards the in-memory database
+        database.close_connection(self.test_db_path)
 
         # Restore the original database path
         quizzes.QUIZ_CACHE_DB = self.original_path
@@ -43,57 +119,36 @@ class TestQuizCacheDatabaseOperations(unittest.TestCase):
         # Initialize the cache
         cache = QuizCache(self.test_db_path)
 
-        # Connect to the database and check if the table exists
-        conn = sqlite3.connect(self.test_db_path)
-        cursor = conn.cursor()
-
-        # Query to check if the table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='module_questions'")
-        table_exists = cursor.fetchone() is not None
-
-        # Check if the table has the correct columns
-        cursor.execute("PRAGMA table_info(module_questions)")
-        columns = cursor.fetchall()
-        column_names = [column[1] for column in columns]
-
+        # Read the columns of the table and of the index backing its primary key.
+        # Both are empty if the table does not exist.
+        conn = sqlite3.connect(self.test_db_path, uri=True)
+        column_names = {row[0] for row in conn.execute("SELECT name FROM pragma_table_info('module_questions')")}
+        pk_index_columns = [row[0] for row in conn.execute(
+            "SELECT info.name FROM pragma_index_list('module_questions') AS list, pragma_index_info(list.name) AS info "
+            "WHERE list.origin = 'pk' ORDER BY info.seqno"
+        )]
         conn.close()
 
-        # Assert that the table exists
-        self.assertTrue(table_exists, "The module_questions table was not created")
+        # Assert that the table exists with all expected columns
+        self.assertEqual(column_names, {'video_id', 'module_title', 'difficulty', 'questions', 'created_at'})
 
-        # Assert that all expected columns exist
-        expected_columns = ['video_id', 'module_title', 'difficulty', 'questions', 'created_at']
-        for column in expected_columns:
-            self.assertIn(column, column_names, f"Column {column} is missing from the module_questions table")
+        # Assert that lookups by video and by video and module use the index
+        self.assertEqual(pk_index_columns, ['video_id', 'module_title'])
 
     def test_get_cached_quiz(self):
         """Test that get_cached_quiz retrieves correct data."""
         # Initialize the cache
         cache = QuizCache(self.test_db_path)
 
-        # Connect to the database and insert test data
-        conn = sqlite3.connect(self.test_db_path)
-        cursor = conn.cursor()
-
         # Test data
         video_id = "test_video_id"
         module_title = "Test Module"
         difficulty = "medium"
-        questions = [
-            {
-                "question": "Test question?",
-                "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
-                "correct_answer": "A",
-                "explanation": "Test explanation"
-            }
-        ]
+        questions = _SAMPLE_QUESTIONS
 
-        # Insert test data
-        cursor.execute(
-            "INSERT INTO module_questions (video_id, module_title, difficulty, questions, created_at) VALUES (?, ?, ?, ?, datetime('now'))",
-            (video_id, module_title, difficulty, json.dumps(questions))
-        )
-        conn.commit()
+        # Connect to the database and insert test data
+        conn = sqlite3.connect(self.test_db_path, uri=True, isolation_level=None)
+        _bulk_insert_quizzes(conn, [(video_id, module_title, difficulty, orjson.dumps(questions))])
         conn.close()
 
         # Retrieve the data using the function
@@ -116,103 +171,87 @@ class TestQuizCacheDatabaseOperations(unittest.TestCase):
         video_id = "test_video_id"
         module_title = "Test Module"
         difficulty = "medium"
-        questions = [
-            {
-                "question": "Test question?",
-                "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
-                "correct_answer": "A",
-                "explanation": "Test explanation"
-            }
-        ]
+        questions = _SAMPLE_QUESTIONS
 
         # Save the data using the function
         cache.save_quiz_to_cache(video_id, module_title, difficulty, questions)
 
         # Connect to the database and retrieve the saved data
-        conn = sqlite3.connect(self.test_db_path)
+        conn = sqlite3.connect(self.test_db_path, uri=True)
         cursor = conn.cursor()
-        cursor.execute("SELECT questions FROM module_questions WHERE video_id = ? AND module_title = ?", (video_id, module_title))
+        cursor.execute("SELECT questions, typeof(questions) FROM module_questions WHERE video_id = ? AND module_title = ?", (video_id, module_title))
         result = cursor.fetchone()
         conn.close()
 
         # Assert that the saved data matches the test data
         self.assertIsNotNone(result, "No data was saved to the database")
-        saved_questions = json.loads(result[0])
+        self.assertEqual(result[1], 'blob')
+        saved_questions = orjson.loads(result[0])
         self.assertEqual(len(saved_questions), 1)
         self.assertEqual(saved_questions[0]['question'], questions[0]['question'])
         self.assertEqual(saved_questions[0]['options'], questions[0]['options'])
         self.assertEqual(saved_questions[0]['correct_answer'], questions[0]['correct_answer'])
         self.assertEqual(saved_questions[0]['explanation'], questions[0]['explanation'])
 
+    def test_save_quizzes_to_cache(self):
+        """Test that save_quizzes_to_cache saves every module's quiz."""
+        # Initialize the cache
+        cache = QuizCache(self.test_db_path)
 
-class TestQuizHelperFunctions(unittest.TestCase):
-    """Tests for the helper functions in the Quizzes module."""
+        # Test data
+        module_quizzes = [
+            {'module_title': 'Module 1', 'questions': [{"question": "Question 1?"}]},
+            {'module_title': 'Module 2', 'questions': [{"question": "Question 2?"}]}
+        ]
 
-    def test_get_module_text(self):
-        """Test get_module_text extracts text correctly."""
-        # Test with a valid module
-        module = {
-            'title': 'Test Module',
-            'content': [
-                {'text': 'This is the first sentence.'},
-                {'text': 'This is the second sentence.'}
-            ]
-        }
-        result = get_module_text(module)
-        expected = 'Test Module This is the first sentence. This is the second sentence.'
-        self.assertEqual(result, expected)
-
-        # Test with an empty module
-        module = {}
-        result = get_module_text(module)
-        self.assertEqual(result, "")
-
-        # Test with a module with no content
-        module = {'title': 'Test Module'}
-        result = get_module_text(module)
-        self.assertEqual(result, "Test Module")
-
-        # Test with a module with empty content
-        module = {'title': 'Test Module', 'content': []}
-        result = get_module_text(module)
-        self.assertEqual(result, "Test Module")
-
-        # Test with a module with invalid content
-        module = {'title': 'Test Module', 'content': 'Not a list'}
-        result = get_module_text(module)
-        self.assertEqual(result, "Test Module")
-
-    @patch('quizzes.client')
-    def test_call_nebius_llm(self, mock_client):
-        """Test call_nebius_llm with mocked API."""
-        # Mock the OpenAI client response
-        mock_response = MagicMock()
-        mock_response.to_json.return_value = '{"choices": [{"message": {"content": "Test response"}}]}'
-        mock_client.chat.completions.create.return_value = mock_response
+        # Save the data using the function
+        cache.save_quizzes_to_cache("test_video_id", "medium", module_quizzes)
 
-        # Call the function
-        result = call_nebius_llm(prompt="Test prompt")
+        # Assert that each module's quiz can be retrieved
+        self.assertEqual(cache.get_cached_quiz("test_video_id", "Module 1"), module_quizzes[0]['questions'])
+        self.assertEqual(cache.get_cached_quiz("test_video_id", "Module 2"), module_quizzes[1]['questions'])
 
-        # Assert that the result is the expected response
-        self.assertEqual(result, '{"choices": [{"message": {"content": "Test response"}}]}')
+    def test_get_cached_quizzes(self):
+        """Test that get_cached_quizzes returns every cached module quiz of a video."""
+        # Initialize the cache
+        cache = QuizCache(self.test_db_path)
 
-        # Verify that the client was called with the correct parameters
-        mock_client.chat.completions.create.assert_called_once()
-        call_args = mock_client.chat.completions.create.call_args[1]
-        self.assertEqual(call_args['model'], "deepseek-ai/DeepSeek-R1")
-        self.assertEqual(call_args['messages'][0]['content'], "Test prompt")
+        module_quizzes = [
+            {'module_title': 'Module 1', 'questions': [{"question": "Question 1?"}]},
+            {'module_title': 'Module 2', 'questions': [{"question": "Question 2?"}]}
+        ]
+        cache.save_quizzes_to_cache("test_video_id", "medium", module_quizzes)
+        cache.save_quiz_to_cache("other_video_id", "Module 3", "medium", [{"question": "Question 3?"}])
 
-    @patch('quizzes.client')
-    def test_call_nebius_llm_error_handling(self, mock_client):
-        """Test error handling in call_nebius_llm."""
-        # Mock the OpenAI client to raise an exception
-        mock_client.chat.completions.create.side_effect = Exception("API Error")
+        # Assert that only the quizzes of the requested video are returned
+        self.assertEqual(cache.get_cached_quizzes("test_video_id"), {
+            'Module 1': module_quizzes[0]['questions'],
+            'Module 2': module_quizzes[1]['questions']
+        })
+        self.assertEqual(cache.get_cached_quizzes("missing_video_id"), {})
 
-        # Call the function
-        result = call_nebius_llm(prompt="Test prompt")
 
-        # Assert that the function returns None on error
-        self.assertIsNone(result)
+class TestQuizHelperFunctions(unittest.TestCase):
+    """Tests for the helper functions in the Quizzes module."""
+
+    def test_get_module_text(self):
+        """Test get_module_text extracts text correctly."""
+        cases = [
+            ("a valid module", {
+                'title': 'Test Module',
+                'content': [
+                    {'text': 'This is the first sentence.'},
+                    {'text': 'This is the second sentence.'}
+                ]
+            }, 'Test Module This is the first sentence. This is the second sentence.'),
+            ("an empty module", {}, ""),
+            ("a module with no content", {'title': 'Test Module'}, "Test Module"),
+            ("a module with empty content", {'title': 'Test Module', 'content': []}, "Test Module"),
+            ("a module with invalid content", {'title': 'Test Module', 'content': 'Not a list'}, "Test Module")
+        ]
+        for description, module, expected in cases:
+            with self.subTest(description):
+                self.assertEqual(get_module_text(module), expected)
 
     @patch('quizzes.logging')
     def test_setup_logging(self, mock_logging):
@@ -234,59 +273,52 @@ class TestQuizHelperFunctions(unittest.TestCase):
         self.assertEqual(mock_logging.FileHandler.call_count, 1)
         self.assertEqual(mock_logging.StreamHandler.call_count, 1)
 
+        # Verify that the log file is written by a background queue listener
+        mock_logging.handlers.QueueListener.assert_called_once()
+        mock_logging.handlers.QueueListener.return_value.start.assert_called_once()
+        mock_logger.addHandler.assert_any_call(mock_logging.handlers.QueueHandler.return_value)
+
 
 class TestQuizGeneration(unittest.TestCase):
     """Tests for the quiz generation functions in the Quizzes module."""
 
-    def setUp(self):
-        """Set up a test environment before each test."""
-        self.test_db_path = 'quizes.db'
-        self.original_path = quizzes.QUIZ_CACHE_DB
-        quizzes.QUIZ_CACHE_DB = self.test_db_path
-
-        # Initialize the cache
-        self.cache = QuizCache(self.test_db_path)
+    @classmethod
+    def setUpClass(cls):
+        """Set up the test database once for all tests."""
+        # Use a shared-cache in-memory database for testing
+        cls.test_db_path = 'file:quiz_generation_test?mode=memory&cache=shared'
+        patcher = patch.object(quizzes, 'QUIZ_CACHE_DB', cls.test_db_path)
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+
+        # Initialize the cache. The schema is only created once per
+        # connection, so the caches built by the tests skip the DDL.
+        cls.cache = QuizCache(cls.test_db_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up after all tests."""
+        # Close the shared connection, which discards the in-memory database
+        database.close_connection(cls.test_db_path)
 
-    def tearDown(self):
-        """Clean up after each test."""
-        # Delete the test database file
-        if os.path.exists(self.test_db_path):
-            os.remove(self.test_db_path)
-        # Restore the original database path
-        quizzes.QUIZ_CACHE_DB = self.original_path
+    def setUp(self):
+        """Clear the quizzes cached by earlier tests, keeping the schema."""
+        with database.cursor(self.test_db_path) as cursor:
+            cursor.execute('DELETE FROM module_questions')
 
     def test_gen_prompt(self):
         """Test gen_prompt generates the correct prompt."""
         # Call the function
         result = gen_prompt("Test text", difficulty="easy", num_questions=3)
 
-        # Assert that the result contains the expected elements
-        self.assertIn("Create 3 easy multiple-choice questions", result)
-        self.assertIn("Test text", result)
-        self.assertIn("Format question as JSON array", result)
+        # Assert that the result contains the expected elements, in order
+        self.assertRegex(result, _PROMPT_RE)
 
     @patch('quizzes.call_nebius_llm')
     def test_course_designer_agent_generate_quiz_questions(self, mock_call_nebius):
         """Test CourseDesignerAgent.generate_quiz_questions with mocked API."""
         # Mock the API response
-        mock_response = json.dumps({
-            'choices': [
-                {
-                    'message': {
-                        'content': '''```json
-[
-  {
-    "question": "Test question?",
-    "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
-    "correct_answer": "A",
-    "explanation": "Test explanation"
-  }
-]```'''
-                    }
-                }
-            ]
-        })
-        mock_call_nebius.return_value = mock_response
+        mock_call_nebius.return_value = f"```json\n{orjson.dumps(_SAMPLE_QUESTIONS).decode()}```"
 
         # Create an agent
         agent = CourseDesignerAgent()
@@ -421,10 +453,10 @@ class TestQuizGeneration(unittest.TestCase):
                 "explanation": "Explanation 2"
             }
         ]
-        mock_agent.generate_quiz_questions.side_effect = [questions1, questions2]
+        mock_agent.generate_quiz_questions_async = AsyncMock(side_effect=[questions1, questions2])
 
-        # Mock QuizCache
-        mock_cache_instance = MagicMock()
+        # Mock QuizCache with no cached quizzes
+        mock_cache_instance = MagicMock(**{'get_cached_quizzes.return_value': {}})
         mock_quiz_cache.return_value = mock_cache_instance
 
         # Call the function
@@ -438,10 +470,142 @@ class TestQuizGeneration(unittest.TestCase):
         self.assertEqual(result[1]['questions'], questions2)
 
         # Verify that the agent was called with the correct parameters
-        self.assertEqual(mock_agent.generate_quiz_questions.call_count, 2)
+        self.assertEqual(mock_agent.generate_quiz_questions_async.await_count, 2)
+
+        # Verify that the generated quizzes were saved to cache in one batch
+        mock_cache_instance.save_quizzes_to_cache.assert_called_once_with("test_video_id", "medium", result)
+
+    @patch('quizzes.get_cached_modules')
+    @patch('quizzes.CourseDesignerAgent')
+    @patch('quizzes.QuizCache')
+    def test_generate_all_module_quizzes_skips_cached(self, mock_quiz_cache, mock_agent_class,
+                                                      mock_get_cached_modules):
+        """Test generate_all_module_quizzes only generates quizzes for uncached modules."""
+        mock_get_cached_modules.return_value = [
+            {'title': 'Module 1', 'content': [{'text': 'Content 1'}]},
+            {'title': 'Module 2', 'content': [{'text': 'Content 2'}]}
+        ]
+
+        # Module 1 already has a cached quiz
+        cached_questions = [{"question": "Cached question?"}]
+        mock_cache_instance = MagicMock(**{'get_cached_quizzes.return_value': {'Module 1': cached_questions}})
+        mock_quiz_cache.return_value = mock_cache_instance
+
+        new_questions = [{"question": "New question?"}]
+        mock_agent = MagicMock(generate_quiz_questions_async=AsyncMock(return_value=new_questions))
+        mock_agent_class.return_value = mock_agent
+
+        # Call the function
+        result = generate_all_module_quizzes("test_video_id", "medium")
+
+        # Assert that both modules are returned in order
+        self.assertEqual(result, [
+            {'module_title': 'Module 1', 'questions': cached_questions},
+            {'module_title': 'Module 2', 'questions': new_questions}
+        ])
+
+        # Verify that only the uncached module was generated and saved
+        mock_agent.generate_quiz_questions_async.assert_awaited_once_with('Module 2 Content 2', 'medium')
+        mock_cache_instance.save_quizzes_to_cache.assert_called_once_with(
+            "test_video_id", "medium", [{'module_title': 'Module 2', 'questions': new_questions}]
+        )
+
+    @patch('quizzes.get_cached_modules')
+    @patch('quizzes.CourseDesignerAgent')
+    @patch('quizzes.QuizCache')
+    def test_generate_all_module_quizzes_runs_concurrently(self, mock_quiz_cache, mock_agent_class,
+                                                           mock_get_cached_modules):
+        """Test that module quizzes are generated concurrently and returned in module order."""
+        mock_get_cached_modules.return_value = [
+            {'title': f'Module {i}', 'content': [{'text': f'Content {i}'}]} for i in range(1, 4)
+        ]
+        mock_quiz_cache.return_value = MagicMock(**{'get_cached_quizzes.return_value': {}})
+
+        in_flight = 0
+        max_in_flight = 0
+
+        async def generate(text, difficulty):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            # Earlier modules take longer, so requests finish in reverse order
+            await asyncio.sleep(0.01 * (4 - int(text[-1])))
+            in_flight -= 1
+            return [{"question": f"Question about {text}?"}]
+
+        mock_agent_class.return_value = MagicMock(generate_quiz_questions_async=AsyncMock(side_effect=generate))
+
+        # Call the function
+        result = generate_all_module_quizzes("test_video_id", "medium")
+
+        # Assert that all requests were in flight at once
+        self.assertEqual(max_in_flight, 3)
+
+        # Assert that each quiz belongs to its module regardless of completion order
+        self.assertEqual([quiz['module_title'] for quiz in result], ['Module 1', 'Module 2', 'Module 3'])
+        for i, quiz in enumerate(result, start=1):
+            self.assertEqual(quiz['questions'], [{"question": f"Question about Module {i} Content {i}?"}])
+
+    @patch('quizzes.get_cached_modules')
+    @patch('quizzes.call_nebius_llm_async')
+    def test_get_quiz_retries_after_failed_generation(self, mock_call_nebius, mock_get_cached_modules):
+        """Test that a failed generation is not cached, so the next request retries it."""
+        mock_get_cached_modules.return_value = [{'title': 'Module 1', 'content': [{'text': 'Content 1'}]}]
+        response = f"```json\n{orjson.dumps(_SAMPLE_QUESTIONS).decode()}\n```"
+
+        # The first LLM call fails, the second one succeeds
+        mock_call_nebius.side_effect = [None, response]
+
+        self.assertIsNone(get_quiz("test_video_id", "Module 1", "medium"))
+        self.assertIsNone(self.cache.get_cached_quiz("test_video_id", "Module 1"))
+
+        self.assertEqual(get_quiz("test_video_id", "Module 1", "medium"), _SAMPLE_QUESTIONS)
+        self.assertEqual(self.cache.get_cached_quiz("test_video_id", "Module 1"), _SAMPLE_QUESTIONS)
+        self.assertEqual(mock_call_nebius.call_count, 2)
+
+    @patch('quizzes.get_cached_modules')
+    @patch('quizzes.call_nebius_llm_async')
+    def test_empty_cached_quiz_is_regenerated(self, mock_call_nebius, mock_get_cached_modules):
+        """Test that an empty quiz cached by an earlier failure counts as a cache miss."""
+        mock_get_cached_modules.return_value = [{'title': 'Module 1', 'content': [{'text': 'Content 1'}]}]
+        mock_call_nebius.return_value = f"```json\n{orjson.dumps(_SAMPLE_QUESTIONS).decode()}\n```"
+        self.cache.save_quiz_to_cache("test_video_id", "Module 1", "medium", [])
+
+        self.assertEqual(get_quiz("test_video_id", "Module 1", "medium"), _SAMPLE_QUESTIONS)
+        mock_call_nebius.assert_called_once()
+
+    @patch('quizzes.get_cached_modules')
+    def test_sequential_generations_reuse_client_connections(self, mock_get_cached_modules):
+        """Test that consecutive requests reuse the async client's pooled connection to the LLM API."""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _ChatCompletionHandler)
+        server.client_addresses = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        # Send requests through the real client and transport, without
+        # retries, so a connection bound to a closed event loop fails the call
+        client = AsyncOpenAI(
+            base_url=f"http://127.0.0.1:{server.server_port}/v1/",
+            api_key="test",
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(http2=True, limits=llm.HTTP_LIMITS)
+        )
+        self.addCleanup(lambda: llm.run_async(client.close()))
+        llm_cache_db = 'file:llm_cache_transport_test?mode=memory&cache=shared'
+        self.addCleanup(database.close_connection, llm_cache_db)
+
+        with patch.object(llm, 'async_client', client), patch.object(llm, 'LLM_CACHE_DB', llm_cache_db):
+            for video_id in ('video_1', 'video_2'):
+                mock_get_cached_modules.return_value = [
+                    {'title': 'Module 1', 'content': [{'text': f'Content of {video_id}'}]}
+                ]
+                result = generate_all_module_quizzes(video_id, "medium")
+                self.assertEqual(result, [{'module_title': 'Module 1', 'questions': _SAMPLE_QUESTIONS}])
 
-        # Verify that the cache was used to save the generated quizzes
-        self.assertEqual(mock_cache_instance.save_quiz_to_cache.call_count, 2)
+        # Both requests went over the same connection
+        self.assertEqual(len(server.client_addresses), 2)
+        self.assertEqual(len(set(server.client_addresses)), 1)
 
     @patch('quizzes.get_cached_modules')
     def test_generate_all_module_quizzes_no_modules(self, mock_get_cached_modules):
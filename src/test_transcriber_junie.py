@@ -1,12 +1,24 @@
+import json
 import unittest
 import sqlite3
 import os
-import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
-import sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import httpx
+import numpy as np
+import orjson
 
+import database
 import transcriber
 from transcriber import (
     init_database, 
@@ -15,20 +27,94 @@ from transcriber import (
     transcribe_youtube_video
 )
 
+
+def _bulk_insert_transcriptions(conn, rows):
+    """
+    Inserts (video_id, title, embed_url, duration, transcript) rows
+    into the transcriptions table in a single transaction.
+
+    The connection must be in autocommit mode, so that the write lock is
+    taken once by BEGIN IMMEDIATE rather than upgraded on the first insert.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany(
+            "INSERT INTO transcriptions (video_id, title, embed_url, duration, transcript, created_at) VALUES (?, ?, ?, ?, ?, datetime('now'))",
+            rows
+        )
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server's payload in byte ranges, recording the Range and
+    User-Agent headers of each request. Requests after the first
+    `fail_after` ones, if set on the server, fail with a server error.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.headers['Range'], self.headers['User-Agent']))
+        if len(self.server.requests) > getattr(self.server, 'fail_after', len(self.server.requests)):
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        payload = self.server.payload
+        first, last = (int(bound) for bound in self.headers['Range'][len('bytes='):].split('-'))
+        body = payload[first:last + 1]
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {first}-{first + len(body) - 1}/{len(payload)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _torch_stub():
+    """
+    Returns a stand-in for the torch module, so the Whisper model tests
+    neither need torch nor import it while sys.modules is patched.
+    Its `inference_mode_active` tells whether an inference_mode block is open.
+    """
+    torch = MagicMock(name='torch', inference_mode_active=False)
+    torch.nn.Linear = type('Linear', (), {})
+    torch.nn.LayerNorm = type('LayerNorm', (), {})
+    torch.ao.quantization.quantize_dynamic.side_effect = lambda model, *args, **kwargs: model
+    torch.cuda.is_available.return_value = False
+
+    @contextmanager
+    def inference_mode():
+        torch.inference_mode_active = True
+        try:
+            yield
+        finally:
+            torch.inference_mode_active = False
+
+    torch.inference_mode = inference_mode
+    return torch
+
+
 class TestTranscriberDatabaseOperations(unittest.TestCase):
     """Tests for the database operations in the Transcriber module."""
 
     def setUp(self):
         """Set up test environment before each test."""
-        self.test_db_path = 'transcriptions.db'
+        # Use a shared-cache in-memory database named after the test
+        self.test_db_path = f'file:transcriptions_{self.id()}?mode=memory&cache=shared'
         self.original_path = transcriber.Transcriptions_CACHE_DB
         transcriber.Transcriptions_CACHE_DB = self.test_db_path
 
     def tearDown(self):
         """Clean up after each test."""
-        # Delete the test database file
-        if os.path.exists(self.test_db_path):
-            os.remove(self.test_db_path)
+        # Closing the shared connection discards the in-memory database
+        database.close_connection(self.test_db_path)
 
         # Restore the original database path
         transcriber.Transcriptions_CACHE_DB = self.original_path
@@ -38,38 +124,27 @@ class TestTranscriberDatabaseOperations(unittest.TestCase):
         # Initialize the database
         init_database()
 
-        # Connect to the database and check if the table exists
-        conn = sqlite3.connect(self.test_db_path)
-        cursor = conn.cursor()
-
-        # Query to check if the table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='transcriptions'")
-        table_exists = cursor.fetchone() is not None
-
-        # Check if the table has the correct columns
-        cursor.execute("PRAGMA table_info(transcriptions)")
-        columns = cursor.fetchall()
-        column_names = [column[1] for column in columns]
-
+        # Read the columns of the table and of the index backing its primary key.
+        # Both are empty if the table does not exist.
+        conn = sqlite3.connect(self.test_db_path, uri=True)
+        column_names = {row[0] for row in conn.execute("SELECT name FROM pragma_table_info('transcriptions')")}
+        pk_index_columns = [row[0] for row in conn.execute(
+            "SELECT info.name FROM pragma_index_list('transcriptions') AS list, pragma_index_info(list.name) AS info "
+            "WHERE list.origin = 'pk' ORDER BY info.seqno"
+        )]
         conn.close()
 
-        # Assert that the table exists
-        self.assertTrue(table_exists, "The transcriptions table was not created")
+        # Assert that the table exists with all expected columns
+        self.assertEqual(column_names, {'video_id', 'title', 'embed_url', 'duration', 'transcript', 'created_at'})
 
-        # Assert that all expected columns exist
-        expected_columns = ['video_id', 'title', 'embed_url', 'duration', 'transcript', 'created_at']
-        for column in expected_columns:
-            self.assertIn(column, column_names, f"Column {column} is missing from the transcriptions table")
+        # Assert that lookups by video use the index
+        self.assertEqual(pk_index_columns, ['video_id'])
 
     def test_get_transcription_from_db(self):
         """Test that get_transcription_from_db retrieves correct data."""
         # Initialize the database
         init_database()
 
-        # Connect to the database and insert test data
-        conn = sqlite3.connect(self.test_db_path)
-        cursor = conn.cursor()
-
         # Test data
         video_id = "test_vid_id"
         title = "Test Video"
@@ -77,12 +152,13 @@ class TestTranscriberDatabaseOperations(unittest.TestCase):
         duration = 120
         transcript = [{"id": 1, "text": "Test transcript"}]
 
-        # Insert test data
-        cursor.execute(
-            "INSERT INTO transcriptions (video_id, title, embed_url, duration, transcript, created_at) VALUES (?, ?, ?, ?, ?, datetime('now'))",
-            (video_id, title, embed_url, duration, json.dumps(transcript))
-        )
-        conn.commit()
+        # Connect to the database and insert test data
+        conn = sqlite3.connect(self.test_db_path, uri=True, isolation_level=None)
+        _bulk_insert_transcriptions(conn, [
+            (video_id, title, embed_url, duration, zlib.compress(orjson.dumps(transcript))),
+            ('uncompressed_vid_id', title, embed_url, duration, orjson.dumps(transcript)),
+            ('text_vid_id', title, embed_url, duration, json.dumps(transcript))
+        ])
         conn.close()
 
         # Retrieve the data using the function
@@ -95,6 +171,12 @@ class TestTranscriberDatabaseOperations(unittest.TestCase):
         self.assertEqual(result['duration'], duration)
         self.assertEqual(result['transcript'], transcript)
 
+        # Transcripts cached before they were compressed are still readable
+        self.assertEqual(get_transcription_from_db('uncompressed_vid_id')['transcript'], transcript)
+
+        # So are transcripts stored as TEXT, as json.dumps wrote them originally
+        self.assertEqual(get_transcription_from_db('text_vid_id')['transcript'], transcript)
+
     def test_save_transcription_to_db(self):
         """Test that save_transcription_to_db saves data correctly."""
         # Initialize the database
@@ -113,9 +195,9 @@ class TestTranscriberDatabaseOperations(unittest.TestCase):
         save_transcription_to_db(video_id, video_info)
 
         # Connect to the database and retrieve the saved data
-        conn = sqlite3.connect(self.test_db_path)
+        conn = sqlite3.connect(self.test_db_path, uri=True)
         cursor = conn.cursor()
-        cursor.execute("SELECT title, embed_url, duration, transcript FROM transcriptions WHERE video_id = ?", (video_id,))
+        cursor.execute("SELECT title, embed_url, duration, transcript, typeof(transcript) FROM transcriptions WHERE video_id = ?", (video_id,))
         result = cursor.fetchone()
         conn.close()
 
@@ -124,53 +206,248 @@ class TestTranscriberDatabaseOperations(unittest.TestCase):
         self.assertEqual(result[0], video_info['title'])
         self.assertEqual(result[1], video_info['embed_url'])
         self.assertEqual(result[2], video_info['duration'])
-        self.assertEqual(json.loads(result[3]), video_info['transcript'])
+        self.assertEqual(orjson.loads(zlib.decompress(result[3])), video_info['transcript'])
+        self.assertEqual(result[4], 'blob')
 
 
 class TestTranscriptionFunction(unittest.TestCase):
     """Tests for the transcription function in the Transcriber module."""
 
+    @classmethod
+    def setUpClass(cls):
+        """Build an empty database with the schema once for all tests."""
+        cls.template = sqlite3.connect(':memory:')
+        cls.template.executescript(transcriber.TRANSCRIPTIONS_SCHEMA)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up after all tests."""
+        cls.template.close()
+
     def setUp(self):
         """Set up test environment before each test."""
-        # Use an in-memory database for testing
-        self.test_db_path = 'transcriptions.db'
+        # Keep the test database in a fresh temporary directory
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_db_path = os.path.join(self.temp_dir.name, 'transcriptions.db')
         self.original_path = transcriber.Transcriptions_CACHE_DB
         transcriber.Transcriptions_CACHE_DB = self.test_db_path
 
-        # Initialize the database
-        init_database()
+        # Copy the pages of the template database instead of running the schema
+        conn = sqlite3.connect(self.test_db_path)
+        self.template.backup(conn)
+        conn.close()
 
     def tearDown(self):
         """Clean up after each test."""
-        # Delete the test database file
-        if os.path.exists(self.test_db_path):
-            os.remove(self.test_db_path)
+        # Close the shared connection and remove the temporary directory
+        database.close_connection(self.test_db_path)
+        self.temp_dir.cleanup()
 
         # Restore the original database path
         transcriber.Transcriptions_CACHE_DB = self.original_path
 
-        # Remove any temporary files created during tests
-        if os.path.exists('temp_audio.wav'):
-            os.remove('temp_audio.wav')
+    def test_database_uses_wal_mode(self):
+        """Test that the transcriptions database is switched to WAL mode."""
+        init_database()
+
+        conn = sqlite3.connect(self.test_db_path)
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        conn.close()
+
+        self.assertEqual(journal_mode, 'wal')
+
+    def test_whisper_not_imported_with_module(self):
+        """Test that importing the transcriber does not import Whisper."""
+        # Use a fresh interpreter, since this one may already have imported it
+        script = "import sys, transcriber; print('whisper' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+    def test_whisper_model_is_cached(self):
+        """Test that the Whisper model is only loaded once per process."""
+        mock_whisper = MagicMock()
+        transcriber._load_whisper_model.cache_clear()
+        self.addCleanup(transcriber._load_whisper_model.cache_clear)
+
+        with patch.dict(sys.modules, {'whisper': mock_whisper, 'faster_whisper': None, 'torch': _torch_stub()}):
+            first = transcriber.load_whisper_model("base")
+            second = transcriber.load_whisper_model("base")
+
+        self.assertIs(first, second)
+        mock_whisper.load_model.assert_called_once_with("base")
+
+    def test_whisper_model_is_loaded_once_by_concurrent_calls(self):
+        """Test that concurrent first calls wait for a single model load."""
+        mock_whisper = MagicMock()
+        mock_whisper.load_model.side_effect = lambda name: time.sleep(0.05) or MagicMock()
+        transcriber._load_whisper_model.cache_clear()
+        self.addCleanup(transcriber._load_whisper_model.cache_clear)
+
+        with patch.dict(sys.modules, {'whisper': mock_whisper, 'faster_whisper': None, 'torch': _torch_stub()}):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                models = list(pool.map(lambda _: transcriber.load_whisper_model("base"), range(4)))
 
-    @patch('transcriber.whisper')
+        mock_whisper.load_model.assert_called_once_with("base")
+        self.assertTrue(all(model is models[0] for model in models))
+
+    def test_openai_whisper_runs_without_autograd(self):
+        """Test that the openai-whisper fallback decodes without autograd, with int8 linear layers on a CPU."""
+        torch = _torch_stub()
+        mock_model = MagicMock(**{'device.type': 'cpu'})
+        in_inference_mode = []
+
+        def transcribe(audio, fp16):
+            in_inference_mode.append(torch.inference_mode_active)
+            return {'segments': [{'id': 0, 'seek': 0, 'start': 0.0, 'end': 2.5, 'text': ' Hello', 'tokens': [1, 2],
+                                  'temperature': 0.0, 'avg_logprob': -0.2, 'compression_ratio': 1.1,
+                                  'no_speech_prob': 0.01}]}
+
+        mock_model.transcribe.side_effect = transcribe
+        mock_whisper = MagicMock(**{'load_model.return_value': mock_model})
+        transcriber._load_whisper_model.cache_clear()
+        self.addCleanup(transcriber._load_whisper_model.cache_clear)
+
+        audio = np.zeros(transcriber.SAMPLE_RATE, dtype=np.float32)
+
+        with patch.dict(sys.modules, {'whisper': mock_whisper, 'faster_whisper': None, 'torch': torch}):
+            result = transcriber.load_whisper_model("base").transcribe(audio)
+
+        mock_model.half.assert_not_called()
+        torch.ao.quantization.quantize_dynamic.assert_called_once_with(mock_model, {torch.nn.Linear},
+                                                                      dtype=torch.qint8, inplace=True)
+        mock_model.transcribe.assert_called_once_with(audio, fp16=False)
+        self.assertEqual(in_inference_mode, [True])
+
+        # Assert that only the segment fields of a TranscriptSegment are kept
+        self.assertEqual(result['segments'], [{'id': 0, 'start': 0.0, 'end': 2.5, 'text': ' Hello'}])
+
+    def test_faster_whisper_is_preferred(self):
+        """Test that faster-whisper is used with int8 weights and batched decoding when it is installed."""
+        segment = SimpleNamespace(id=0, seek=0, start=0.0, end=2.5, text=' Hello', tokens=(1, 2),
+                                  temperature=0.0, avg_logprob=-0.2, compression_ratio=1.1,
+                                  no_speech_prob=0.01)
+        mock_pipeline = MagicMock(**{'transcribe.return_value': (iter([segment]), None)})
+        mock_faster_whisper = MagicMock(**{'BatchedInferencePipeline.return_value': mock_pipeline})
+        mock_ctranslate2 = MagicMock(**{'get_cuda_device_count.return_value': 0})
+        transcriber._load_whisper_model.cache_clear()
+        self.addCleanup(transcriber._load_whisper_model.cache_clear)
+
+        with patch.dict(sys.modules, {'faster_whisper': mock_faster_whisper, 'ctranslate2': mock_ctranslate2}):
+            model = transcriber.load_whisper_model("base")
+
+        mock_faster_whisper.WhisperModel.assert_called_once_with("base", device="auto", compute_type="int8",
+                                                                 cpu_threads=os.cpu_count() or 0)
+        mock_faster_whisper.BatchedInferencePipeline.assert_called_once_with(
+            model=mock_faster_whisper.WhisperModel.return_value)
+
+        # Assert that segments are returned in the openai-whisper format, without the decoder's fields
+        audio = np.zeros(transcriber.SAMPLE_RATE, dtype=np.float32)
+        result = model.transcribe(audio)
+        # Assert the complete set of decoding options, since the batched
+        # pipeline's defaults differ from those of WhisperModel
+        mock_pipeline.transcribe.assert_called_once_with(audio, beam_size=1, vad_filter=True, batch_size=4,
+                                                         without_timestamps=False)
+        self.assertEqual(result['segments'], [{'id': 0, 'start': 0.0, 'end': 2.5, 'text': ' Hello'}])
+
+    def test_env_int(self):
+        """Test that integer settings fall back to their default when empty or invalid."""
+        for value, expected in [('', 0), ('16', 16)]:
+            with self.subTest(value=value), patch.dict(os.environ, {'WHISPER_BATCH_SIZE': value}):
+                self.assertEqual(transcriber._env_int('WHISPER_BATCH_SIZE', 0), expected)
+
+        for value in ['many', '-2']:
+            with self.subTest(value=value), patch.dict(os.environ, {'WHISPER_BATCH_SIZE': value}), \
+                    self.assertLogs('transcriber', 'WARNING'):
+                self.assertEqual(transcriber._env_int('WHISPER_BATCH_SIZE', 0), 0)
+
+    @patch('transcriber.subprocess.run')
+    def test_load_audio(self, mock_run):
+        """Test that load_audio decodes the stream with ffmpeg into float samples."""
+        mock_run.return_value = MagicMock(stdout=np.array([0, 16384, -32768], dtype=np.int16).tobytes())
+
+        # Call the function
+        audio = transcriber.load_audio('https://example.com/audio', {'User-Agent': 'test'})
+
+        # Assert that the samples are scaled to [-1, 1)
+        self.assertEqual(audio.dtype, np.float32)
+        np.testing.assert_array_equal(audio, [0.0, 0.5, -1.0])
+
+        # Verify that ffmpeg sent the headers and wrote 16 kHz mono PCM to stdout
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd[0], 'ffmpeg')
+        self.assertEqual(cmd[cmd.index('-headers') + 1], 'User-Agent: test\r\n')
+        self.assertLess(cmd.index('-headers'), cmd.index('-i'))
+        self.assertEqual(cmd[cmd.index('-i') + 1], 'https://example.com/audio')
+        self.assertEqual(cmd[-7:], ['-f', 's16le', '-ac', '1', '-ar', '16000', 'pipe:1'])
+
+    def test_load_audio_in_ranges(self):
+        """Test that load_audio fetches the stream in byte ranges and pipes them into ffmpeg."""
+        samples = np.array([0, 16384, -32768], dtype=np.int16)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _RangeRequestHandler)
+        server.payload = samples.tobytes()
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        # Stand in for ffmpeg with cat, which passes the PCM bytes it is fed through unchanged
+        commands = []
+        real_popen = subprocess.Popen
+
+        def popen(cmd, **kwargs):
+            commands.append(cmd)
+            return real_popen(['cat'], **kwargs)
+
+        with patch('transcriber.subprocess.Popen', popen):
+            audio = transcriber.load_audio(f'http://127.0.0.1:{server.server_port}/audio',
+                                           {'User-Agent': 'test'}, chunk_size=4)
+
+        np.testing.assert_array_equal(audio, [0.0, 0.5, -1.0])
+
+        # Verify that the 6 byte stream was fetched in two ranges with the headers
+        self.assertEqual(server.requests, [('bytes=0-3', 'test'), ('bytes=4-7', 'test')])
+
+        # Verify that ffmpeg read the stream from stdin
+        self.assertEqual(commands[0][:5], ['ffmpeg', '-loglevel', 'error', '-i', 'pipe:0'])
+        self.assertEqual(commands[0][-7:], ['-f', 's16le', '-ac', '1', '-ar', '16000', 'pipe:1'])
+
+    def test_load_audio_in_ranges_raises_download_errors(self):
+        """Test that a failed range request fails load_audio instead of returning partial audio."""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _RangeRequestHandler)
+        server.payload = bytes(6)
+        server.requests = []
+        server.fail_after = 1
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        real_popen = subprocess.Popen
+        with patch('transcriber.subprocess.Popen', lambda cmd, **kwargs: real_popen(['cat'], **kwargs)):
+            with self.assertRaises(httpx.HTTPStatusError):
+                transcriber.load_audio(f'http://127.0.0.1:{server.server_port}/audio', chunk_size=4)
+
+    @patch('transcriber.load_audio')
+    @patch('transcriber.load_whisper_model')
     @patch('transcriber.yt_dlp.YoutubeDL')
-    def test_transcribe_youtube_video_with_mocked_dependencies(self, mock_ytdl, mock_whisper):
+    def test_transcribe_youtube_video_with_mocked_dependencies(self, mock_ytdl, mock_load_whisper_model,
+                                                               mock_load_audio):
         """Test transcribe_youtube_video with mocked dependencies."""
         # Mock YoutubeDL extract_info
-        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120}
-        mock_ytdl_instance = MagicMock()
-        mock_ytdl_instance.extract_info.return_value = mock_info
-        mock_ytdl.return_value.__enter__.return_value = mock_ytdl_instance
+        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120, 'url': 'https://example.com/audio',
+                     'downloader_options': {'http_chunk_size': 10485760}}
+        mock_ytdl_instance = MagicMock(**{'extract_info.return_value': mock_info})
+        mock_ytdl.configure_mock(**{'return_value.__enter__.return_value': mock_ytdl_instance})
 
         # Mock whisper model
-        mock_model = MagicMock()
-        mock_model.transcribe.return_value = {
+        mock_model = MagicMock(**{'transcribe.return_value': {
             'segments': [
-                {'id': 1, 'text': 'Test transcript', 'start': 0, 'end': 10}
+                {'id': 1, 'start': 0, 'end': 10, 'text': 'Test transcript'}
             ]
-        }
-        mock_whisper.load_model.return_value = mock_model
+        }})
+        mock_load_whisper_model.return_value = mock_model
 
         # Call the function
         url = "https://www.youtube.com/watch?v=test_vid_id"
@@ -181,40 +458,68 @@ class TestTranscriptionFunction(unittest.TestCase):
         self.assertEqual(result['title'], 'Test Video')
         self.assertEqual(result['embed_url'], 'https://www.youtube.com/embed/test_vid_id')
         self.assertEqual(result['duration'], 120)
-        self.assertEqual(len(result['transcript']), 1)
-        self.assertEqual(result['transcript'][0]['text'], 'Test transcript')
+        self.assertEqual(result['transcript'], [{'id': 1, 'start': 0, 'end': 10, 'text': 'Test transcript'}])
 
-        # Verify that the model was called with the correct parameters
-        mock_whisper.load_model.assert_called_once_with("base")
+        # Verify that a single extraction resolved both the video and its audio stream
+        mock_ytdl_instance.extract_info.assert_called_once_with(url, download=False)
+
+        # Verify that the audio stream was decoded in memory and transcribed
+        mock_load_audio.assert_called_once_with('https://example.com/audio', None, 10485760)
+        mock_load_whisper_model.assert_called_once_with(transcriber.WHISPER_MODEL)
+        mock_model.transcribe.assert_called_once_with(mock_load_audio.return_value)
+
+    @patch('transcriber.load_audio')
+    @patch('transcriber.load_whisper_model')
+    @patch('transcriber.yt_dlp.YoutubeDL')
+    def test_audio_download_overlaps_model_load(self, mock_ytdl, mock_load_whisper_model, mock_load_audio):
+        """Test that the audio is fetched while the Whisper model loads."""
+        mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120, 'url': 'https://example.com/audio'}
+        mock_ytdl_instance = MagicMock(**{'extract_info.return_value': mock_info})
+        mock_ytdl.configure_mock(**{'return_value.__enter__.return_value': mock_ytdl_instance})
+
+        # Each stand-in only returns once the other one has started
+        both_started = threading.Barrier(2, timeout=5)
+        mock_model = MagicMock(**{'transcribe.return_value': {'segments': []}})
+
+        def load_whisper_model(name):
+            both_started.wait()
+            return mock_model
+
+        def load_audio(stream_url, http_headers, chunk_size):
+            both_started.wait()
+            return np.zeros(transcriber.SAMPLE_RATE, dtype=np.float32)
+
+        mock_load_whisper_model.side_effect = load_whisper_model
+        mock_load_audio.side_effect = load_audio
+
+        result = transcribe_youtube_video("https://www.youtube.com/watch?v=test_vid_id")
+
+        self.assertIsNotNone(result)
+        self.assertFalse(both_started.broken)
         mock_model.transcribe.assert_called_once()
 
-    @patch('transcriber.whisper')
+    @patch('transcriber.load_whisper_model')
     @patch('transcriber.yt_dlp.YoutubeDL')
-    def test_caching_mechanism(self, mock_ytdl, mock_whisper):
+    def test_caching_mechanism(self, mock_ytdl, mock_load_whisper_model):
         """Test that the caching mechanism works correctly."""
         # Mock YoutubeDL extract_info
         mock_info = {'id': 'test_vid_id', 'title': 'Test Video', 'duration': 120}
-        mock_ytdl_instance = MagicMock()
-        mock_ytdl_instance.extract_info.return_value = mock_info
-        mock_ytdl.return_value.__enter__.return_value = mock_ytdl_instance
+        mock_ytdl_instance = MagicMock(**{'extract_info.return_value': mock_info})
+        mock_ytdl.configure_mock(**{'return_value.__enter__.return_value': mock_ytdl_instance})
 
         # Mock whisper model
-        mock_model = MagicMock()
-        mock_model.transcribe.return_value = {
+        mock_model = MagicMock(**{'transcribe.return_value': {
             'segments': [
                 {'id': 1, 'text': 'Test transcript', 'start': 0, 'end': 10}
             ]
-        }
-        mock_whisper.load_model.return_value = mock_model
+        }})
+        mock_load_whisper_model.return_value = mock_model
 
         # Insert test data into the database to simulate cached data
-        conn = sqlite3.connect(self.test_db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO transcriptions (video_id, title, embed_url, duration, transcript, created_at) VALUES (?, ?, ?, ?, ?, datetime('now'))",
-            ('test_vid_id', 'Cached Video', 'https://www.youtube.com/embed/test_vid_id', 120, json.dumps([{'id': 1, 'text': 'Cached transcript'}]))
-        )
-        conn.commit()
+        conn = sqlite3.connect(self.test_db_path, isolation_level=None)
+        _bulk_insert_transcriptions(conn, [
+            ('test_vid_id', 'Cached Video', 'https://www.youtube.com/embed/test_vid_id', 120, orjson.dumps([{'id': 1, 'text': 'Cached transcript'}]))
+        ])
         conn.close()
 
         # Call the function
@@ -227,15 +532,14 @@ class TestTranscriptionFunction(unittest.TestCase):
         self.assertEqual(result['transcript'][0]['text'], 'Cached transcript')
 
         # Verify that the model was not called (since we used cached data)
-        mock_whisper.load_model.assert_not_called()
+        mock_load_whisper_model.assert_not_called()
 
     @patch('transcriber.yt_dlp.YoutubeDL')
     def test_error_handling_for_invalid_urls(self, mock_ytdl):
         """Test error handling for invalid URLs."""
         # Mock YoutubeDL to raise an exception
-        mock_ytdl_instance = MagicMock()
-        mock_ytdl_instance.extract_info.side_effect = Exception("Invalid URL")
-        mock_ytdl.return_value.__enter__.return_value = mock_ytdl_instance
+        mock_ytdl_instance = MagicMock(**{'extract_info.side_effect': Exception("Invalid URL")})
+        mock_ytdl.configure_mock(**{'return_value.__enter__.return_value': mock_ytdl_instance})
 
         # Call the function with an invalid URL
         url = "https://www.youtube.com/watch?v=invalid_url"
@@ -245,5 +549,27 @@ class TestTranscriptionFunction(unittest.TestCase):
         self.assertIsNone(result, "Function should return None for invalid URLs")
 
 
+    @patch('transcriber.transcribe_youtube_video')
+    def test_transcribe_many(self, mock_transcribe):
+        """Test that transcribe_many transcribes the videos in worker processes, in order."""
+        mock_transcribe.side_effect = lambda url: {'title': url}
+        pools = []
+
+        def process_pool(max_workers, mp_context, initializer, initargs):
+            # Run the workers as threads, so they see the mocked transcription
+            pools.append(SimpleNamespace(max_workers=max_workers, mp_context=mp_context, initargs=initargs))
+            return ThreadPoolExecutor(max_workers)
+
+        urls = [f"https://www.youtube.com/watch?v=vid_{i}" for i in range(3)]
+        with patch('transcriber.ProcessPoolExecutor', process_pool), patch('os.cpu_count', return_value=8):
+            results = transcriber.transcribe_many(urls)
+
+        self.assertEqual(results, [{'title': url} for url in urls])
+        self.assertEqual(pools[0].max_workers, 2)
+        self.assertEqual(pools[0].mp_context.get_start_method(), 'spawn')
+        self.assertEqual(pools[0].initargs, (4,))
+        self.assertEqual(transcriber.transcribe_many([]), [])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,25 +1,51 @@
-from typing import Dict, List, Optional, Any, TypedDict
-import whisper
+import asyncio
+import contextlib
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Any, Tuple, TypedDict, Union
+import httpx
 import yt_dlp
+import numpy as np
+import orjson
 import os
-import sqlite3
-import json
-from datetime import datetime
+import subprocess
+import tempfile
+import threading
+import zlib
+
+import database
 
 from openai.resources.audio import Transcriptions
 
 
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    """
+    Reads a non-negative integer setting from the environment, falling back
+    to the default if it is unset or invalid
+    """
+    value: str = os.environ.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        logger.warning("Ignoring invalid %s=%r, using %d", name, value, default)
+        return default
+    return number
+
+
 class TranscriptSegment(TypedDict):
     id: int
-    seek: int
     start: float
     end: float
     text: str
-    tokens: List[int]
-    temperature: float
-    avg_logprob: float
-    compression_ratio: float
-    no_speech_prob: float
 
 
 class VideoInfo(TypedDict):
@@ -31,24 +57,56 @@ class VideoInfo(TypedDict):
 
 Transcriptions_CACHE_DB = './data/transcriptions.db'
 
+# Whisper model to transcribe with; smaller models such as "tiny", or
+# "distil-small.en" with faster-whisper, trade some accuracy for speed
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+
+# Number of audio chunks faster-whisper decodes at once; by default 8 on a GPU
+# and 4 on a CPU
+WHISPER_BATCH_SIZE = _env_int("WHISPER_BATCH_SIZE", 0)
+
+# CPU threads each model replica uses when transcribing several videos at once
+TRANSCRIPTION_WORKER_THREADS = 4
+
+# Sample rate of the audio Whisper transcribes
+SAMPLE_RATE = 16000
+
+TRANSCRIPTIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS transcriptions (
+        video_id TEXT PRIMARY KEY,
+        title TEXT,
+        embed_url TEXT,
+        duration INTEGER,
+        transcript BLOB,
+        created_at TIMESTAMP
+    );
+'''
+
+
+def _pack_transcript(transcript: List[TranscriptSegment]) -> bytes:
+    """
+    Serializes a transcript for the cache, deflated since its segments repeat
+    the same keys and largely hold text
+    """
+    return zlib.compress(orjson.dumps(transcript, option=orjson.OPT_SERIALIZE_NUMPY), 1)
+
+
+def _unpack_transcript(blob: Union[bytes, str]) -> List[TranscriptSegment]:
+    """
+    Deserializes a cached transcript, including one cached uncompressed,
+    as JSON bytes or as the TEXT that older versions stored
+    """
+    if isinstance(blob, bytes) and blob[:1] != b'[':
+        blob = zlib.decompress(blob)
+    return orjson.loads(blob)
+
+
 def init_database() -> None:
     """
-    Initializes the SQLite database and creates the necessary table if it doesn't exist.
-    """
-    conn: sqlite3.Connection = sqlite3.connect(Transcriptions_CACHE_DB)
-    cursor: sqlite3.Cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transcriptions (
-            video_id TEXT PRIMARY KEY,
-            title TEXT,
-            embed_url TEXT,
-            duration INTEGER,
-            transcript TEXT,
-            created_at TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    Initializes the SQLite database and creates the necessary table if it doesn't exist,
+    once per connection
+    """
+    database.init_schema(Transcriptions_CACHE_DB, TRANSCRIPTIONS_SCHEMA)
 
 
 def get_transcription_from_db(video_id: str) -> Optional[VideoInfo]:
@@ -61,18 +119,20 @@ def get_transcription_from_db(video_id: str) -> Optional[VideoInfo]:
     Returns:
         Dictionary containing video information and transcript if found, None otherwise.
     """
-    conn: sqlite3.Connection = sqlite3.connect(Transcriptions_CACHE_DB)
-    cursor: sqlite3.Cursor = conn.cursor()
-    cursor.execute('SELECT * FROM transcriptions WHERE video_id = ?', (video_id,))
-    result: Optional[tuple] = cursor.fetchone()
-    conn.close()
+    with database.cursor(Transcriptions_CACHE_DB) as cursor:
+        cursor.execute(
+            'SELECT title, embed_url, duration, transcript FROM transcriptions WHERE video_id = ?',
+            (video_id,)
+        )
+        result: Optional[tuple] = cursor.fetchone()
 
     if result:
+        title, embed_url, duration, transcript = result
         return {
-            'title': result[1],
-            'embed_url': result[2],
-            'duration': result[3],
-            'transcript': json.loads(result[4])
+            'title': title,
+            'embed_url': embed_url,
+            'duration': duration,
+            'transcript': _unpack_transcript(transcript)
         }
     return None
 
@@ -85,22 +145,253 @@ def save_transcription_to_db(video_id: str, video_info: VideoInfo) -> None:
         video_id: The YouTube video ID
         video_info: Dictionary containing video information and transcript
     """
-    conn: sqlite3.Connection = sqlite3.connect(Transcriptions_CACHE_DB)
-    cursor: sqlite3.Cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO transcriptions 
-        (video_id, title, embed_url, duration, transcript, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        video_id,
-        video_info['title'],
-        video_info['embed_url'],
-        video_info['duration'],
-        json.dumps(video_info['transcript']),
-        datetime.now()
-    ))
-    conn.commit()
-    conn.close()
+    transcript: bytes = _pack_transcript(video_info['transcript'])
+    with database.cursor(Transcriptions_CACHE_DB) as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO transcriptions
+            (video_id, title, embed_url, duration, transcript, created_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (
+            video_id,
+            video_info['title'],
+            video_info['embed_url'],
+            video_info['duration'],
+            transcript
+        ))
+
+
+def _iter_ranges(stream_url: str, http_headers: Optional[Dict[str, str]], chunk_size: int) -> Iterator[bytes]:
+    """
+    Downloads a stream in consecutive byte ranges of chunk_size bytes, as
+    yt-dlp does, since YouTube throttles a single unranged request to about
+    real-time speed
+    """
+    with httpx.Client(headers=http_headers, follow_redirects=True, timeout=30) as client:
+        start: int = 0
+        while True:
+            response = client.get(stream_url, headers={'Range': f'bytes={start}-{start + chunk_size - 1}'})
+            if response.status_code == 416:
+                return  # The previous range ended exactly at the end of the stream
+            response.raise_for_status()
+            yield response.content
+
+            # A server that ignores ranges answers 200 with the whole stream
+            if response.status_code != 206:
+                return
+            # Content-Range is "bytes first-last/total", or ends in "*" if the total is unknown
+            content_range: str = response.headers.get('Content-Range', '')
+            last, _, total = content_range.rpartition('-')[2].partition('/')
+            if total.isdigit() and int(last) + 1 >= int(total):
+                return
+            if len(response.content) < chunk_size:
+                return
+            start += chunk_size
+
+
+def _pipe_ranges(cmd: List[str], stream_url: str, http_headers: Optional[Dict[str, str]],
+                 chunk_size: int) -> bytes:
+    """
+    Runs an ffmpeg command reading from stdin while a thread feeds it the
+    stream range by range, and returns what it writes to stdout
+    """
+    errors: List[BaseException] = []
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+
+        def feed() -> None:
+            try:
+                for chunk in _iter_ranges(stream_url, http_headers, chunk_size):
+                    process.stdin.write(chunk)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                # Closing stdin ends ffmpeg's input; it fails if ffmpeg already exited
+                with contextlib.suppress(OSError):
+                    process.stdin.close()
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        output: bytes = process.stdout.read()
+        process.wait()
+        feeder.join()
+
+        if process.returncode:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, cmd, output, stderr.read())
+    # A failed download ends ffmpeg's input early, which it takes for the end
+    # of the stream, so the error has to be raised here
+    if errors:
+        raise errors[0]
+    return output
+
+
+def load_audio(stream_url: str, http_headers: Optional[Dict[str, str]] = None,
+               chunk_size: Optional[int] = None) -> np.ndarray:
+    """
+    Decodes an audio stream with ffmpeg straight into memory.
+
+    Args:
+        stream_url: URL of the audio stream, as resolved by yt-dlp.
+        http_headers: HTTP headers to send to fetch the stream.
+        chunk_size: Size of the byte ranges to fetch the stream in, as set by
+            yt-dlp in the format's downloader_options. Without it, ffmpeg
+            fetches the stream in a single request.
+
+    Returns:
+        Mono float32 samples at the sample rate Whisper expects.
+    """
+    output_args: List[str] = ['-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1']
+
+    if chunk_size:
+        cmd: List[str] = ['ffmpeg', '-loglevel', 'error', '-i', 'pipe:0'] + output_args
+        output: bytes = _pipe_ranges(cmd, stream_url, http_headers, chunk_size)
+    else:
+        cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error']
+        if http_headers:
+            cmd += ['-headers', ''.join(f"{name}: {value}\r\n" for name, value in http_headers.items())]
+        cmd += ['-i', stream_url] + output_args
+        output = subprocess.run(cmd, capture_output=True, check=True).stdout
+
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+class _FasterWhisperModel:
+    """
+    Adapts a faster-whisper model to the interface of an openai-whisper model,
+    keeping only the segment fields of a TranscriptSegment
+    """
+
+    def __init__(self, model: Any, batch_size: int):
+        self.model = model
+        self.batch_size = batch_size
+
+    def transcribe(self, audio: Any) -> Dict[str, Any]:
+        # Greedy decoding roughly halves the decoder time at little cost in
+        # accuracy, and the voice activity filter skips silent stretches. The
+        # speech it finds is cut into 30 second chunks that are decoded in
+        # batches instead of one after the other. Timestamps are decoded so
+        # that each chunk is split into segments of a few seconds, which the
+        # page seeks to and the modules are split at.
+        segments, _ = self.model.transcribe(audio, beam_size=1, vad_filter=True, batch_size=self.batch_size,
+                                            without_timestamps=False)
+        return {
+            'segments': [{
+                'id': segment.id,
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text
+            } for segment in segments]
+        }
+
+
+class _OpenAIWhisperModel:
+    """
+    Runs an openai-whisper model without autograd, in fp16 and with the
+    spectrogram computed on a GPU, or with int8 linear layers on a CPU,
+    keeping only the segment fields of a TranscriptSegment
+    """
+
+    def __init__(self, model: Any):
+        import torch
+        import whisper
+
+        if model.device.type == "cuda":
+            # Keep the weights in fp16 so they are not cast on every forward
+            # pass, except for the LayerNorms, which run in fp32
+            model = model.half()
+            for module in model.modules():
+                if isinstance(module, whisper.model.LayerNorm):
+                    module.float()
+        elif model.device.type == "cpu":
+            # Whisper's Linear subclass only casts its weights to the input
+            # dtype, a no-op in fp32, but dynamic quantization only replaces
+            # plain nn.Linear layers with their int8 counterparts
+            for module in model.modules():
+                if type(module) is whisper.model.Linear:
+                    module.__class__ = torch.nn.Linear
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8,
+                                                           inplace=True)
+        self.model = model
+
+    def transcribe(self, audio: Any) -> Dict[str, Any]:
+        import torch
+
+        cuda: bool = self.model.device.type == "cuda"
+        if cuda:
+            # Whisper computes the log-mel spectrogram on the device of the
+            # audio, so moving the samples over runs the STFT on the GPU
+            audio = torch.from_numpy(audio).to(self.model.device)
+
+        with torch.inference_mode():
+            result: Dict[str, Any] = self.model.transcribe(audio, fp16=cuda)
+
+        # Keep only the fields the modules and quizzes use, dropping the
+        # decoder's tokens and statistics, which make up most of each segment
+        return {
+            'segments': [
+                {key: segment[key] for key in TranscriptSegment.__annotations__}
+                for segment in result['segments']
+            ]
+        }
+
+
+_whisper_model_lock = threading.Lock()
+
+# CPU threads the model may use, 0 for all of them
+_cpu_threads = 0
+
+
+def load_whisper_model(name: str = "base") -> Any:
+    """
+    Loads a Whisper model, once per process.
+
+    If faster-whisper is installed, the model runs on its CTranslate2 backend
+    with int8 weights, which transcribes several times faster than the
+    PyTorch reference implementation. Otherwise openai-whisper is used.
+
+    Whisper is imported here rather than at module level since it pulls in
+    torch, which is only needed once a video actually has to be transcribed.
+    The loaded model is kept, so later transcriptions reuse it, and requests
+    arriving while it loads wait for it instead of loading it again.
+
+    Args:
+        name: Name of the Whisper model to load.
+    """
+    with _whisper_model_lock:
+        return _load_whisper_model(name)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_whisper_model(name: str) -> Any:
+    try:
+        import ctranslate2
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+    except ImportError:
+        import whisper
+        return _OpenAIWhisperModel(whisper.load_model(name))
+
+    cuda: bool = ctranslate2.get_cuda_device_count() > 0
+    model = WhisperModel(name, device="auto", compute_type="int8_float16" if cuda else "int8",
+                         cpu_threads=_cpu_threads or os.cpu_count() or 0)
+    return _FasterWhisperModel(BatchedInferencePipeline(model=model),
+                               WHISPER_BATCH_SIZE or (8 if cuda else 4))
+
+
+async def _load_audio_and_model(info: Dict[str, Any]) -> Tuple[np.ndarray, Any]:
+    """
+    Downloads the audio stream resolved in a video's info and loads the
+    Whisper model concurrently
+
+    Both are blocking, the download on the network and the model on disk,
+    so each runs in a thread and the slower of the two sets the wait.
+    """
+    audio, model = await asyncio.gather(
+        asyncio.to_thread(load_audio, info['url'], info.get('http_headers'),
+                          (info.get('downloader_options') or {}).get('http_chunk_size')),
+        asyncio.to_thread(load_whisper_model, WHISPER_MODEL)
+    )
+    return audio, model
 
 
 def transcribe_youtube_video(url: str) -> Optional[VideoInfo]:
@@ -117,11 +408,12 @@ def transcribe_youtube_video(url: str) -> Optional[VideoInfo]:
         # Initialize database
         init_database()
 
-        # Extract video ID and check database first
+        # Extract video ID and check database first. The same extraction
+        # resolves the audio stream, in case the video has to be transcribed
         ydl_opts: Dict[str, Any] = {
             'quiet': True,
             'no_warnings': True,
-            'extract_flat': True
+            'format': 'bestaudio/best'
         }
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info: Dict[str, Any] = ydl.extract_info(url, download=False)
@@ -135,8 +427,6 @@ def transcribe_youtube_video(url: str) -> Optional[VideoInfo]:
             return cached_result
 
         # If not in the database, proceed with transcription
-        model: Any = whisper.load_model("base")
-
         embed_url: str = f"https://www.youtube.com/embed/{video_id}"
         video_info: VideoInfo = {
             'title': info.get('title', ''),
@@ -145,25 +435,14 @@ def transcribe_youtube_video(url: str) -> Optional[VideoInfo]:
             'transcript': []  # Will be populated after transcription
         }
 
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'wav',
-            }],
-            'outtmpl': 'temp_audio'
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        # Fetch the audio, decoding it in memory instead of downloading it
+        # to a file first, while the model loads
+        audio, model = asyncio.run(_load_audio_and_model(info))
 
-        result: Dict[str, Any] = model.transcribe('temp_audio.wav')
+        result: Dict[str, Any] = model.transcribe(audio)
 
         video_info['transcript'] = result['segments']
 
-        # Clean up a temporary audio file
-        if os.path.exists('temp_audio.wav'):
-            os.remove('temp_audio.wav')
-
         # Save result to a database
         save_transcription_to_db(video_id, video_info)
         print("Saved new transcription to database")
@@ -173,3 +452,43 @@ def transcribe_youtube_video(url: str) -> Optional[VideoInfo]:
     except Exception as e:
         print(f"Failed to process YouTube URL: {str(e)}")
         return None
+
+
+def _init_transcription_worker(cpu_threads: int) -> None:
+    """
+    Limits the threads of the model replica in a worker process
+    """
+    global _cpu_threads
+    _cpu_threads = cpu_threads
+    # torch reads this when whisper first imports it in the worker
+    os.environ['OMP_NUM_THREADS'] = str(cpu_threads)
+
+
+def transcribe_many(urls: List[str], processes: Optional[int] = None) -> List[Optional[VideoInfo]]:
+    """
+    Transcribes several YouTube videos in parallel worker processes.
+
+    Each worker loads its own Whisper model limited to
+    TRANSCRIPTION_WORKER_THREADS threads, so the cores are shared between
+    the replicas and one video downloads while another is transcribed.
+
+    Args:
+        urls: The URLs of the YouTube videos.
+        processes: Number of worker processes, by default as many as the
+            cores allow with TRANSCRIPTION_WORKER_THREADS threads each.
+
+    Returns:
+        The result of transcribe_youtube_video for each URL, in order.
+    """
+    if not urls:
+        return []
+    if processes is None:
+        processes = max(1, (os.cpu_count() or 1) // TRANSCRIPTION_WORKER_THREADS)
+    processes = min(processes, len(urls))
+    cpu_threads = max(1, (os.cpu_count() or 1) // processes)
+
+    # Spawn rather than fork the workers, since CUDA cannot be used in a
+    # forked process
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_transcription_worker, initargs=(cpu_threads,)) as pool:
+        return list(pool.map(transcribe_youtube_video, urls))